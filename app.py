@@ -1,8 +1,11 @@
+import os
+from functools import partial
+
 from flask import Flask
 from pathlib import Path
-from werkzeug.security import generate_password_hash
+from sqlalchemy import event
 
-from extensions import db, login_manager
+from extensions import db, login_manager, apply_sqlite_pragmas, close_analytics_session
 
 def create_app():
     app = Flask(__name__)
@@ -10,12 +13,106 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     base_dir = Path(__file__).resolve().parent
-    db_dir = base_dir / "database"
+    # DATABASE_DIR: مكان app.db و cache.db (مثلاً قاعدة مؤقتة لأدوات القياس)
+    db_dir = Path(os.getenv("DATABASE_DIR", base_dir / "database"))
     db_file = db_dir / "app.db"
     db_dir.mkdir(parents=True, exist_ok=True)
 
     app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_file.as_posix()}"
 
+    # Connection pools: one connection per gunicorn thread (+ the batched writer),
+    # a smaller read-only pool for admin analytics; pragmas applied per connection
+    threads = int(os.getenv("GUNICORN_THREADS", "1"))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", str(max(5, threads + 1)))),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        # اتصال يُستخدم من thread واحد في كل مرة؛ uri=True لـ ATTACH 'file:...?mode=ro' (الأرشيف)
+        "connect_args": {"check_same_thread": False, "uri": True},
+    }
+    app.config["SQLALCHEMY_BINDS"] = {
+        "analytics": {
+            "url": app.config["SQLALCHEMY_DATABASE_URI"],
+            "pool_size": int(os.getenv("ANALYTICS_POOL_SIZE", "2")),
+        },
+    }
+    app.config["SQLITE_CACHE_KB"] = int(os.getenv("SQLITE_CACHE_KB", "8192"))
+    app.config["SQLITE_MMAP_MB"] = int(os.getenv("SQLITE_MMAP_MB", "256"))
+
+    # Cache shared by all workers (separate SQLite file, keyed by data version)
+    app.config["SHARED_CACHE_PATH"] = str(db_dir / "cache.db")
+
+    # Survey writes: "direct" (commit per request) or "batched" (group commit per worker)
+    app.config["INGEST_MODE"] = os.getenv("INGEST_MODE", "direct")
+    # batched only: "flush" = reply after the batch is committed, "enqueue" = reply once queued
+    app.config["INGEST_DURABILITY"] = os.getenv("INGEST_DURABILITY", "flush")
+    app.config["INGEST_BATCH_SIZE"] = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+    app.config["INGEST_FLUSH_INTERVAL"] = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.2"))
+    app.config["INGEST_FLUSH_TIMEOUT"] = float(os.getenv("INGEST_FLUSH_TIMEOUT", "10"))
+
+    # Background exports: pool processes per worker + how many finished files to keep
+    app.config["EXPORT_JOB_WORKERS"] = int(os.getenv("EXPORT_JOB_WORKERS", "1"))
+    app.config["EXPORT_CACHE_KEEP"] = int(os.getenv("EXPORT_CACHE_KEEP", "50"))
+    # Inline /admin/export/excel above this many responses is queued as a job instead (0 = no limit)
+    app.config["INLINE_EXPORT_MAX_ROWS"] = int(os.getenv("INLINE_EXPORT_MAX_ROWS", "20000"))
+
+    # Bulk import (CSV/XLSX, same background pool): rows per transaction, errors kept per job, upload limit
+    app.config["IMPORT_CHUNK_SIZE"] = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+    app.config["IMPORT_MAX_ERRORS"] = int(os.getenv("IMPORT_MAX_ERRORS", "500"))
+    app.config["IMPORT_MAX_MB"] = int(os.getenv("IMPORT_MAX_MB", "50"))
+
+    # Public pages (survey/about) rendered once per process and served compressed with ETags
+    app.config["PAGE_CACHE"] = os.getenv("PAGE_CACHE", "1") == "1"
+    app.config["PAGE_CACHE_MAX_AGE"] = int(os.getenv("PAGE_CACHE_MAX_AGE", "300"))
+
+    # Live dashboard (SSE): how often browsers come back for new increments
+    app.config["SSE_RETRY_MS"] = int(os.getenv("SSE_RETRY_MS", "3000"))
+    # ... and how long one stream stays open (a whole process on sync workers, so 0 = answer at once;
+    # gunicorn.conf.py raises it in post_fork when the worker that actually runs is threaded)
+    app.config["SSE_HOLD_SECONDS"] = float(os.getenv("SSE_HOLD_SECONDS", "0"))
+    app.config["SSE_POLL_MS"] = int(os.getenv("SSE_POLL_MS", "1000"))
+
+    # Metrics: per-worker values merged through this file; /metrics also accepts "Bearer METRICS_TOKEN"
+    app.config["METRICS_PATH"] = os.getenv("METRICS_PATH", str(db_dir / "metrics.db"))
+    app.config["METRICS_FLUSH_INTERVAL"] = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN", "")
+    # Requests slower than this are logged with their SQL statements
+    app.config["SLOW_REQUEST_MS"] = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+    # Profiling: admins opt in per request (X-Profile / ?profile=1|sample);
+    # PROFILE_SAMPLE_RATE profiles that fraction of requests to the listed endpoints
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    app.config["PROFILE_SAMPLE_ENDPOINTS"] = set(os.getenv(
+        "PROFILE_SAMPLE_ENDPOINTS", "admin.export_excel,admin.export_pdf,admin.dashboard"
+    ).split(","))
+    app.config["PROFILE_SAMPLE_MODE"] = os.getenv("PROFILE_SAMPLE_MODE", "sample")
+    app.config["PROFILE_SAMPLE_INTERVAL"] = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+    app.config["PROFILE_KEEP"] = int(os.getenv("PROFILE_KEEP", "50"))
+
+    # Archived months: one read-only SQLite file each; `flask archive-responses` moves months this old
+    app.config["ARCHIVE_DIR"] = os.getenv("ARCHIVE_DIR", str(db_dir / "archive"))
+    app.config["ARCHIVE_AFTER_MONTHS"] = int(os.getenv("ARCHIVE_AFTER_MONTHS", "12"))
+
+    # How many .db files to keep in backups/
+    app.config["BACKUP_KEEP"] = int(os.getenv("BACKUP_KEEP", "10"))
+
+    # Logged-in user snapshot kept per worker (seconds); login attempts per IP and failed ones per (account, IP) per window
+    app.config["USER_CACHE_TTL"] = float(os.getenv("USER_CACHE_TTL", "60"))
+    app.config["LOGIN_MAX_PER_IP"] = int(os.getenv("LOGIN_MAX_PER_IP", "20"))
+    app.config["LOGIN_MAX_PER_ACCOUNT"] = int(os.getenv("LOGIN_MAX_PER_ACCOUNT", "5"))
+    app.config["LOGIN_WINDOW"] = float(os.getenv("LOGIN_WINDOW", "300"))
+
+    # Survey submissions per IP (token bucket: burst, then SUBMIT_RATE_PER_MIN); form tokens remembered this long
+    app.config["SUBMIT_RATE_PER_MIN"] = float(os.getenv("SUBMIT_RATE_PER_MIN", "30"))
+    app.config["SUBMIT_BURST"] = int(os.getenv("SUBMIT_BURST", "30"))
+    app.config["SUBMIT_TOKEN_TTL"] = float(os.getenv("SUBMIT_TOKEN_TTL", "86400"))
+
+    # خلف reverse proxy (مثل Render): عدد الـ proxies الموثوقة في X-Forwarded-For
+    proxy_hops = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+    if proxy_hops:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
     db.init_app(app)
     login_manager.init_app(app)
 
@@ -23,41 +120,62 @@ def create_app():
     from routes.main import main_bp
     from routes.auth import auth_bp
     from routes.admin import admin_bp
+    from routes.metrics import metrics_bp
 
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
+
+    # Option dictionary helpers for templates (codes -> labels)
+    from services.options import option_label, active_options
+    app.jinja_env.globals.update(option_label=option_label, survey_options=active_options)
+
+    # Fingerprinted CSS/JS from static/dist (asset_url in templates, served under /assets/)
+    from services.assets import init_assets
+    init_assets(app)
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        from models.user import User
-        return User.query.get(int(user_id))
+    # Opt-in cProfile / stack sampling per request
+    from services.profiling import init_profiling
+    init_profiling(app)
+
+    # CLI
+    from services.migrations import init_db_command
+    from services.tallies import rebuild_tallies_command
+    from services.imports import import_responses_command
+    from services.partitions import archive_responses_command
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_tallies_command)
+    app.cli.add_command(import_responses_command)
+    app.cli.add_command(archive_responses_command)
+
+    # نسخة احتياطية استُعيدت من عامل آخر؟ نعيد فتح الاتصالات ونمسح الكاش المحلي
+    from services.backups import check_restore_generation
+    app.before_request(check_restore_generation)
+
+    # المستخدم من كاش العامل بدل استعلام في كل طلب
+    from services.users import load_user
+    login_manager.user_loader(load_user)
+
+    app.teardown_appcontext(close_analytics_session)
 
     with app.app_context():
-        from models.user import User
-        from models.response import SurveyResponse  # noqa: F401
-
-        db.create_all()
-
-        # Admin default
-        admin_email = "ali@admin.com"
-        admin = User.query.filter_by(email=admin_email).first()
-        if not admin:   
-            admin = User(
-                name="Survey Admin",
-                email=admin_email,
-                password=generate_password_hash("Ali@123"),
-                role="admin",
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("✅ DB ready + ADMIN created (ali@admin.com / Admin@123)")
-        else:
-            print("✅ DB ready + ADMIN already exists")
+        pragmas = dict(cache_kib=app.config["SQLITE_CACHE_KB"], mmap_mb=app.config["SQLITE_MMAP_MB"])
+        event.listen(db.engine, "connect", partial(apply_sqlite_pragmas, **pragmas))
+        event.listen(
+            db.engines["analytics"], "connect",
+            partial(apply_sqlite_pragmas, **pragmas, query_only=True),
+        )
+
+        # Request timing + SQL accounting (request hooks and engine events)
+        from services.metrics import init_metrics
+        init_metrics(app)
 
     return app
 
 app = create_app()
 
 if __name__ == "__main__":
+    from services.migrations import init_database
+    init_database(app)
     app.run(host="0.0.0.0", port=8000)
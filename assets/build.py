@@ -0,0 +1,245 @@
+"""
+Builds the fingerprinted static bundle in static/dist/.
+
+    pip install -r assets/requirements.txt
+    python -m assets.build
+
+- app.css: Tailwind (only the classes found in templates/) + the Font Awesome
+  rules for the icons the templates use, minified into one file; the icon
+  fonts are subset to exactly those glyphs (woff2).
+- chart.js: the vendored Chart.js UMD build (assets/vendor/).
+- img/*: copies of static/img/.
+
+Every file gets a content hash in its name, text files get .gz/.br
+siblings, and static/dist/manifest.json maps logical names to the hashed
+ones (services/assets.py serves them). Run it again after changing
+templates, assets/ or static/img/, and commit static/dist/.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "assets"
+TEMPLATES = ROOT / "templates"
+DIST = ROOT / "static" / "dist"
+MANIFEST = "manifest.json"
+
+# logical name -> source file (copied as-is)
+VENDORED = {
+    "chart.js": SRC / "vendor" / "chart.umd.min.js",
+}
+
+# ملفات نصية فقط تستفيد من الضغط المسبق (الصور و woff2 مضغوطة أصلاً)
+COMPRESSIBLE = {".css", ".js", ".svg", ".json"}
+
+# Font Awesome style class -> (css file, webfont)
+FA_STYLES = {
+    "fa-solid": ("solid", "fa-solid-900"),
+    "fas": ("solid", "fa-solid-900"),
+    "fa-regular": ("regular", "fa-regular-400"),
+    "far": ("regular", "fa-regular-400"),
+    "fa-brands": ("brands", "fa-brands-400"),
+    "fab": ("brands", "fa-brands-400"),
+}
+
+_ICON_RULE = re.compile(r'\.fa-([a-z0-9-]+)::before \{\s*content: "\\([0-9a-f]+)"; \}\s*')
+_FA_CLASS = re.compile(r"\bfa[srb]?(?:-[a-z0-9]+)+\b|\bfa[srb]\b")
+
+
+def fingerprint(name: str, data: bytes) -> str:
+    stem, dot, suffix = name.rpartition(".")
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return f"{stem}.{digest}.{suffix}" if dot else f"{name}.{digest}"
+
+
+# ---------------------------------------------------------------------------
+# Font Awesome subset
+# ---------------------------------------------------------------------------
+
+def _fontawesome_dir() -> Path:
+    import fontawesomefree
+    return Path(fontawesomefree.__file__).parent / "static" / "fontawesomefree"
+
+
+def used_fa_classes() -> set:
+    found = set()
+    for path in TEMPLATES.rglob("*.html"):
+        found.update(_FA_CLASS.findall(path.read_text(encoding="utf-8")))
+    return found
+
+
+def _subset_font(path: Path, codepoints) -> bytes:
+    from fontTools import subset
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = []
+    options.name_IDs = ["*"]  # حقوق الخط (SIL OFL) تبقى داخل الملف
+    font = subset.load_font(str(path), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    out = io.BytesIO()
+    subset.save_font(font, out, options)
+    return out.getvalue()
+
+
+def build_icons(out: dict) -> str:
+    """Returns the icon CSS; writes the subset fonts into `out` (logical name -> bytes)."""
+    fa = _fontawesome_dir()
+    used = used_fa_classes()
+    codepoints = set()
+
+    def keep(match):
+        if f"fa-{match.group(1)}" in used:
+            codepoints.add(int(match.group(2), 16))
+            return match.group(0)
+        return ""
+
+    css = [_ICON_RULE.sub(keep, (fa / "css" / "fontawesome.css").read_text(encoding="utf-8"))]
+
+    for css_name, font in sorted({FA_STYLES[c] for c in used if c in FA_STYLES}):
+        data = _subset_font(fa / "webfonts" / f"{font}.woff2", codepoints)
+        hashed = fingerprint(f"{font}.woff2", data)
+        out[hashed] = data
+        style = (fa / "css" / f"{css_name}.css").read_text(encoding="utf-8")
+        # woff2 فقط (كل المتصفحات الحالية)، بالاسم المبصوم
+        style = re.sub(
+            r'src: url\("\.\./webfonts/[^"]+\.woff2"\) format\("woff2"\)[^;]*;',
+            f'src: url("{hashed}") format("woff2");',
+            style,
+        )
+        css.append(style)
+
+    print(f"  icons: {len(codepoints)} glyphs from {len(used)} classes")
+    return "\n".join(css)
+
+
+# ---------------------------------------------------------------------------
+# Tailwind
+# ---------------------------------------------------------------------------
+
+def _tailwind_command():
+    # TAILWINDCSS يسمح باستخدام نسخة أخرى (مثلاً npx @tailwindcss/cli)
+    if os.getenv("TAILWINDCSS"):
+        return os.getenv("TAILWINDCSS").split()
+    return [sys.executable, "-m", "tailwindcss_bin"]
+
+
+def build_css(icons_css: str) -> bytes:
+    with tempfile.TemporaryDirectory() as tmp:
+        entry = Path(tmp) / "entry.css"
+        icons = Path(tmp) / "icons.css"
+        output = Path(tmp) / "app.css"
+        icons.write_text(icons_css, encoding="utf-8")
+        entry.write_text(
+            f'@import "{(SRC / "app.css").as_posix()}";\n@import "{icons.as_posix()}";\n',
+            encoding="utf-8",
+        )
+        subprocess.run(
+            [*_tailwind_command(), "-i", str(entry), "-o", str(output), "--minify"],
+            check=True,
+            cwd=ROOT,
+        )
+        css = output.read_bytes()
+    # الـ minifier يحذف تعليق ترخيص Font Awesome (مطلوب للإسناد)
+    banner = re.match(r"\s*(/\*!.*?\*/)", icons_css, re.S)
+    if banner:
+        css = banner.group(1).encode("utf-8") + b"\n" + css
+    return css
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+
+def _compressed(data: bytes):
+    yield "gzip", ".gz", gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return
+    yield "br", ".br", brotli.compress(data, quality=11)
+
+
+def write_dist(files: dict, assets: dict) -> dict:
+    """files: hashed name -> bytes; assets: logical name -> hashed name."""
+    DIST.mkdir(parents=True, exist_ok=True)
+    encodings = {}
+    written = {MANIFEST}
+    for name, data in files.items():
+        path = DIST / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        written.add(name)
+        if path.suffix not in COMPRESSIBLE:
+            continue
+        for encoding, suffix, body in _compressed(data):
+            if len(body) < len(data):
+                (DIST / (name + suffix)).write_bytes(body)
+                written.add(name + suffix)
+                encodings.setdefault(name, []).append(encoding)
+
+    manifest = {"assets": dict(sorted(assets.items())), "encodings": dict(sorted(encodings.items()))}
+    (DIST / MANIFEST).write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+
+    # ملفات البناءات السابقة
+    for path in sorted(DIST.rglob("*"), reverse=True):
+        rel = path.relative_to(DIST).as_posix()
+        if path.is_file() and rel not in written:
+            path.unlink()
+        elif path.is_dir() and not any(path.iterdir()):
+            path.rmdir()
+    return manifest
+
+
+def build() -> dict:
+    files, assets = {}, {}
+
+    print("building app.css")
+    css = build_css(build_icons(files))
+    assets["app.css"] = fingerprint("app.css", css)
+    files[assets["app.css"]] = css
+
+    for name, source in VENDORED.items():
+        data = source.read_bytes()
+        assets[name] = fingerprint(source.name, data)
+        files[assets[name]] = data
+
+    for source in sorted((ROOT / "static" / "img").rglob("*")):
+        if source.is_file():
+            name = source.relative_to(ROOT / "static").as_posix()
+            data = source.read_bytes()
+            assets[name] = fingerprint(name, data)
+            files[assets[name]] = data
+
+    manifest = write_dist(files, assets)
+    for name, hashed in manifest["assets"].items():
+        size = (DIST / hashed).stat().st_size
+        extra = ", ".join(
+            f"{e} {(DIST / (hashed + ('.br' if e == 'br' else '.gz'))).stat().st_size / 1024:.1f} KB"
+            for e in manifest["encodings"].get(hashed, ())
+        )
+        print(f"  {name:<14} -> {hashed}  {size / 1024:.1f} KB" + (f" ({extra})" if extra else ""))
+    return manifest
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.split("\n\n")[0]).parse_args()
+    if not shutil.which(_tailwind_command()[0]):
+        sys.exit(f"tailwind not found: {_tailwind_command()[0]}")
+    build()
+
+
+if __name__ == "__main__":
+    main()
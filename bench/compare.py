@@ -0,0 +1,80 @@
+"""
+Compares two benchmark results (JSON from bench.run):
+
+    python -m bench.compare current.json bench/baseline.json --tolerance 0.1
+
+Exit code 1 when any endpoint regressed by more than the tolerance.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# metric -> True when higher is better
+METRICS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+}
+
+# المقاييس التي تُعتبر تراجعًا إذا ساءت أكثر من الحد المسموح
+GATED = ("throughput_rps", "p95_ms", "peak_rss_mb")
+
+
+def compare(current, baseline, tolerance=0.10):
+    """One row per (mode, endpoint, metric) present in both results."""
+    rows = []
+    for mode, endpoints in current.get("results", {}).items():
+        for name, metrics in endpoints.items():
+            base = baseline.get("results", {}).get(mode, {}).get(name)
+            if base is None:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                new, old = metrics.get(metric), base.get(metric)
+                if not new or not old:
+                    continue
+                change = (new - old) / old
+                worse = -change if higher_is_better else change
+                rows.append({
+                    "mode": mode,
+                    "endpoint": name,
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change_pct": round(change * 100, 1),
+                    "regression": metric in GATED and worse > tolerance,
+                })
+    return rows
+
+
+def print_report(rows, stream=sys.stdout):
+    if not rows:
+        print("no comparable endpoints", file=stream)
+        return
+    for r in rows:
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(
+            f"{r['mode']:<10} {r['endpoint']:<14} {r['metric']:<15}"
+            f" {r['baseline']:>10} -> {r['current']:>10} ({r['change_pct']:+.1f}%){flag}",
+            file=stream,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("current")
+    parser.add_argument("baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    rows = compare(current, baseline, args.tolerance)
+    print_report(rows)
+    sys.exit(1 if any(r["regression"] for r in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
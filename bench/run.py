@@ -0,0 +1,493 @@
+"""
+Benchmark harness for the survey app.
+
+Seeds a temporary database, then drives the main endpoints in-process
+(Flask test client) and/or through a local gunicorn with concurrent
+clients, and writes throughput, p50/p95/p99 latency and peak RSS per
+endpoint as JSON:
+
+    python -m bench.run --rows 100000 --mode both --clients 8 --out bench.json
+    python -m bench.run --rows 100000 --baseline bench/baseline.json
+
+With --baseline the run is compared against a stored result and the exit
+code is 1 when any endpoint regressed by more than --tolerance.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+from bench.compare import compare, print_report
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ADMIN_EMAIL = "ali@admin.com"
+ADMIN_PASSWORD = "Ali@123"
+
+# name -> (method, admin only, default number of requests)
+ENDPOINTS = {
+    "survey_submit": ("POST", False, 500),
+    "dashboard": ("GET", True, 200),
+    "stats_api": ("GET", True, 200),
+    "export_excel": ("GET", True, 5),
+    "export_pdf": ("GET", True, 20),
+}
+
+
+def _survey_form(rng):
+    from models.option import SURVEY_OPTIONS
+    return {q: rng.choice(labels) for q, labels in SURVEY_OPTIONS.items()}
+
+
+def _request_for(name, rng, day_from, day_to):
+    """-> (method, path, form or None)"""
+    span = urlencode({"from": day_from.isoformat(), "to": day_to.isoformat()})
+    if name == "survey_submit":
+        return "POST", "/", _survey_form(rng)
+    if name == "dashboard":
+        return "GET", "/admin/dashboard", None
+    if name == "stats_api":
+        return "GET", "/admin/api/stats", None
+    if name == "export_excel":
+        return "GET", f"/admin/export/excel?{span}", None
+    if name == "export_pdf":
+        return "GET", f"/admin/export/pdf?{span}", None
+    raise ValueError(name)
+
+
+# ---------------------------------------------------------------------------
+# Clients
+# ---------------------------------------------------------------------------
+
+def _check_login(status):
+    # الدخول الناجح وحده يحوّل للوحة (302)؛ 200 = بيانات خاطئة و429 = حدّ المحاولات.
+    # بدون هذا الفحص تُقاس صفحة الدخول أو تحويلاتها بدل الصفحات المحمية.
+    if status != 302:
+        raise RuntimeError(f"admin login failed (HTTP {status}); check ADMIN_PASSWORD and login limits")
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def login(self):
+        resp = self.client.post("/auth/login", data={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        _check_login(resp.status_code)
+
+    def request(self, method, path, form=None):
+        resp = self.client.open(path, method=method, data=form)
+        resp.get_data()  # الردود المتدفقة تُستهلك كاملة مثل المتصفح
+        resp.close()
+        return resp.status_code
+
+
+class HttpClient:
+    """Keep-alive HTTP/1.1 client with a single session cookie."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.conn = http.client.HTTPConnection(host, port, timeout=300)
+        self.cookie = None
+
+    def login(self):
+        status = self.request("POST", "/auth/login", {"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        _check_login(status)
+
+    def request(self, method, path, form=None):
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # العامل أغلق الاتصال (keepalive انتهى) — اتصال جديد ومحاولة واحدة
+            self.conn.close()
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        resp.read()
+        cookie = resp.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return resp.status
+
+
+# ---------------------------------------------------------------------------
+# Memory sampling
+# ---------------------------------------------------------------------------
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _process_tree(root_pid):
+    """root_pid and all its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fh:
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+
+class RssSampler(threading.Thread):
+    """Peak summed RSS of a process tree while the block runs."""
+
+    def __init__(self, root_pid, interval=0.05):
+        super().__init__(daemon=True)
+        self.root_pid, self.interval = root_pid, interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.sample()
+            self._done.wait(self.interval)
+
+    def sample(self):
+        if os.path.isdir("/proc"):
+            total = sum(_rss_bytes(pid) for pid in _process_tree(self.root_pid))
+        else:
+            import resource
+            total = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        self.peak = max(self.peak, total)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self.join()
+        self.sample()
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def run_endpoint(name, make_client, total, clients, warmup, rss_pid, day_from, day_to):
+    method, admin_only, _ = ENDPOINTS[name]
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        try:
+            client = make_client()
+            if admin_only:
+                client.login()
+            for _ in range(warmup):
+                client.request(*_request_for(name, rng, day_from, day_to))
+        except Exception as e:
+            setup_error.append(e)
+            ready.abort()  # لا ينتظر الخيط الرئيسي عميلًا لن يصل
+            return
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            return  # كل العملاء سجلوا الدخول وسخّنوا قبل بدء القياس
+        local, seen = [], {}
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            started = time.perf_counter()
+            try:
+                status = client.request(*_request_for(name, rng, day_from, day_to))
+            except Exception:
+                status = 599
+            local.append(time.perf_counter() - started)
+            seen[status] = seen.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for status, n in seen.items():
+                statuses[status] = statuses.get(status, 0) + n
+
+    ready = threading.Barrier(clients + 1)
+    setup_error = []
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        for t in threads:
+            t.join()
+        raise setup_error[0]
+    with RssSampler(rss_pid) as rss:
+        began = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - began
+
+    latencies.sort()
+    # كل ما ليس 200 خطأ: تحويل 302 لصفحة الدخول أو 202 "قيد الحفظ" ليس الصفحة المقاسة
+    errors = sum(n for status, n in statuses.items() if status != 200)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "method": method,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "clients": clients,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "peak_rss_mb": round(rss.peak / 1024 / 1024, 1),
+    }
+
+
+def run_suite(label, make_client, endpoints, counts, clients, warmup, rss_pid, days):
+    day_to = (datetime.utcnow() + timedelta(hours=3)).date()
+    day_from = day_to - timedelta(days=days)
+    results = {}
+    for name in endpoints:
+        print(f"[{label}] {name}: {counts[name]} requests, {clients} clients", flush=True)
+        results[name] = run_endpoint(
+            name, make_client, counts[name], clients, warmup, rss_pid, day_from, day_to
+        )
+        r = results[name]
+        print(
+            f"    {r['throughput_rps']} req/s  p50 {r['p50_ms']}ms  p95 {r['p95_ms']}ms"
+            f"  p99 {r['p99_ms']}ms  rss {r['peak_rss_mb']}MB  errors {r['errors']}",
+            flush=True,
+        )
+        if r["errors"]:
+            print(f"    statuses {r['statuses']}", flush=True)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# gunicorn
+# ---------------------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, env, worker_class=None, threads=None):
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "gunicorn", "-c", str(ROOT / "gunicorn.conf.py"),
+        "--bind", f"127.0.0.1:{port}",
+        "--access-logfile", "/dev/null",
+        "--log-level", "warning",
+    ]
+    if workers:
+        cmd += ["--workers", str(workers)]
+    # عبر البيئة وليس --threads: gunicorn.conf.py ينقل العدد للتطبيق (حجم الـ pool)
+    if worker_class:
+        env["GUNICORN_WORKER_CLASS"] = worker_class
+    if threads:
+        env["GUNICORN_THREADS"] = str(threads)
+    proc = subprocess.Popen(cmd + ["app:app"], cwd=ROOT, env=env)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not become ready within 60s")
+
+
+def stop_gunicorn(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_counts(pairs):
+    counts = {name: spec[2] for name, spec in ENDPOINTS.items()}
+    for pair in pairs or ():
+        name, _, n = pair.partition("=")
+        if name not in ENDPOINTS or not n.isdigit():
+            raise SystemExit(f"--requests expects name=N with name in {list(ENDPOINTS)}")
+        counts[name] = int(n)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="synthetic responses to seed (10k .. 5M)")
+    parser.add_argument("--days", type=int, default=180, help="seeded date span; exports cover all of it")
+    parser.add_argument("--mode", choices=("inprocess", "gunicorn", "both"), default="both")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent clients per endpoint")
+    parser.add_argument("--workers", type=int, default=None, help="gunicorn workers (default: gunicorn.conf.py)")
+    parser.add_argument("--worker-class", choices=("sync", "gthread"), default=None,
+                        help="gunicorn worker class (default: gunicorn.conf.py)")
+    parser.add_argument("--threads", type=int, default=None, help="threads per gthread worker")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma separated subset")
+    parser.add_argument("--requests", nargs="*", metavar="NAME=N", help="requests per endpoint, e.g. export_excel=3")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests per client")
+    parser.add_argument("--db-dir", help="reuse this database directory instead of a temporary one")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database")
+    parser.add_argument("--out", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--baseline", help="compare against this JSON result")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {sorted(unknown)}")
+    counts = _parse_counts(args.requests)
+
+    db_dir = Path(args.db_dir or tempfile.mkdtemp(prefix="survey-bench-"))
+    db_dir.mkdir(parents=True, exist_ok=True)
+    # يجب أن يُضبط قبل استيراد app (create_app يُنفَّذ عند الاستيراد)
+    os.environ["DATABASE_DIR"] = str(db_dir)
+    # كل العملاء من 127.0.0.1: حدود الإرسال/الدخول لكل IP تُرفع حتى لا تُقاس كأخطاء
+    os.environ.setdefault("SUBMIT_BURST", "1000000")
+    os.environ.setdefault("LOGIN_MAX_PER_IP", "1000000")
+    os.environ.setdefault("LOGIN_MAX_PER_ACCOUNT", "1000000")
+    # export_excel يقيس التصدير المباشر نفسه، لا تحويله لمهمة خلفية
+    os.environ.setdefault("INLINE_EXPORT_MAX_ROWS", "0")
+    sys.path.insert(0, str(ROOT))
+
+    try:
+        from app import app
+        from extensions import db
+        from models.response import SurveyResponse
+        from services.migrations import init_database
+        from bench.seed import seed
+
+        init_database(app)
+
+        with app.app_context():
+            existing = db.session.query(db.func.count(SurveyResponse.id)).scalar()
+        if existing < args.rows:
+            print(f"seeding {args.rows - existing} rows into {db_dir}", flush=True)
+            seed_seconds = seed(app, args.rows - existing, days=args.days)
+        else:
+            seed_seconds = 0.0
+
+        result = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "rows": args.rows,
+                "days": args.days,
+                "clients": args.clients,
+                "workers": args.workers,
+                "worker_class": args.worker_class or os.getenv("GUNICORN_WORKER_CLASS", "sync"),
+                "threads": args.threads or os.getenv("GUNICORN_THREADS"),
+                "requests": {name: counts[name] for name in endpoints},
+                "seed_seconds": round(seed_seconds, 1),
+                "ingest_mode": app.config["INGEST_MODE"],
+            },
+            "results": {},
+        }
+
+        if args.mode in ("inprocess", "both"):
+            result["results"]["inprocess"] = run_suite(
+                "inprocess", lambda: InProcessClient(app), endpoints, counts,
+                args.clients, args.warmup, os.getpid(), args.days,
+            )
+
+        if args.mode in ("gunicorn", "both"):
+            # العمّال يفتحون القاعدة بأنفسهم
+            with app.app_context():
+                db.session.remove()
+                for engine in db.engines.values():
+                    engine.dispose()
+            proc, port = start_gunicorn(args.workers, dict(os.environ), args.worker_class, args.threads)
+            try:
+                result["results"]["gunicorn"] = run_suite(
+                    "gunicorn", lambda: HttpClient("127.0.0.1", port), endpoints, counts,
+                    args.clients, args.warmup, proc.pid, args.days,
+                )
+            finally:
+                stop_gunicorn(proc)
+    finally:
+        if not args.db_dir and not args.keep:
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+        print(f"✅ results written to {args.out}")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        rows = compare(result, baseline, args.tolerance)
+        print_report(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
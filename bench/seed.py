@@ -0,0 +1,122 @@
+"""
+Fills a (temporary) database with synthetic survey responses.
+
+    DATABASE_DIR=/tmp/bench-db python -m bench.seed --rows 1000000
+
+Answers are drawn per question from fixed, plausible distributions and the
+timestamps are spread over the last `--days` days, then survey_tally and
+survey_rollup are rebuilt so the app sees a consistent database.
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# نسب تقريبية لكل خيار (نفس ترتيب SURVEY_OPTIONS = الكود 1..n)
+OPTION_WEIGHTS = {
+    "gender": [0.45, 0.55],
+    "education_stage": [0.20, 0.15, 0.55, 0.10],
+    "satisfaction": [0.15, 0.35, 0.25, 0.15, 0.10],
+    "understanding_help": [0.15, 0.30, 0.35, 0.15, 0.05],
+    "device": [0.70, 0.22, 0.08],
+    "internet_quality": [0.10, 0.35, 0.35, 0.20],
+    "platform_ease": [0.25, 0.40, 0.25, 0.10],
+    "teacher_interaction": [0.10, 0.30, 0.35, 0.15, 0.10],
+    "study_preference": [0.20, 0.45, 0.35],
+    "continue_elearning": [0.40, 0.35, 0.25],
+}
+
+CHUNK_SIZE = 100_000
+
+
+def _chunk(rng, start_epoch, span_seconds, n, questions):
+    """One chunk of rows: (created_at, local_day, *codes) sorted by created_at."""
+    offsets = np.sort(rng.random(n) * span_seconds)
+    created = np.datetime64(int(start_epoch), "s") + (offsets * 1e6).astype("timedelta64[us]")
+    created_txt = np.char.replace(np.datetime_as_string(created, unit="us"), "T", " ")
+    local_day = np.datetime_as_string(
+        (created + np.timedelta64(3, "h")).astype("datetime64[D]"), unit="D"
+    )
+    codes = [
+        rng.choice(len(OPTION_WEIGHTS[q]), size=n, p=OPTION_WEIGHTS[q]) + 1 for q in questions
+    ]
+    return zip(created_txt.tolist(), local_day.tolist(), *(c.tolist() for c in codes))
+
+
+def seed(app, rows, days=180, seed_value=42, quiet=False):
+    """Appends `rows` synthetic responses to the app's database and rebuilds aggregates."""
+    from extensions import db
+    from models.option import SURVEY_OPTIONS
+    from models.response import QUESTION_FIELDS, SurveyResponse
+    from services.backups import get_sqlite_db_path
+    from services.tallies import rebuild_tallies
+
+    for q in QUESTION_FIELDS:
+        if len(OPTION_WEIGHTS[q]) != len(SURVEY_OPTIONS[q]):
+            raise ValueError(f"OPTION_WEIGHTS[{q!r}] does not match SURVEY_OPTIONS")
+
+    rng = np.random.default_rng(seed_value)
+    questions = list(QUESTION_FIELDS)
+    now = time.time()
+    # الأجزاء تغطي فترات متتالية، فترتيب id = ترتيب created_at كما في الواقع
+    chunks = max(1, -(-rows // CHUNK_SIZE))
+    span = days * 86400 / chunks
+    start = now - days * 86400
+
+    with app.app_context():
+        db_path = get_sqlite_db_path()
+        indexes = list(SurveyResponse.__table__.indexes)
+        db.session.remove()
+        db.engine.dispose()
+
+    began = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    # الإدخال بدون فهارس ثم بناؤها مرة واحدة أسرع بكثير
+    for index in indexes:
+        conn.execute(f"DROP INDEX IF EXISTS {index.name}")
+    sql = (
+        f"INSERT INTO survey_response (created_at, local_day, {', '.join(questions)}) "
+        f"VALUES ({', '.join('?' * (len(questions) + 2))})"
+    )
+    done = 0
+    for i in range(chunks):
+        n = min(CHUNK_SIZE, rows - done)
+        conn.executemany(sql, _chunk(rng, start + i * span, span, n, questions))
+        conn.commit()
+        done += n
+        if not quiet:
+            print(f"  {done}/{rows} rows", flush=True)
+    conn.close()
+
+    with app.app_context():
+        with db.engine.begin() as c:
+            for index in indexes:
+                index.create(c, checkfirst=True)
+        rebuild_tallies()
+        db.session.remove()
+
+    return time.perf_counter() - began
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=180, help="spread timestamps over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if "DATABASE_DIR" not in os.environ:
+        parser.error("set DATABASE_DIR so the seed does not touch database/app.db")
+
+    from app import app
+    from services.migrations import init_database
+    init_database(app)
+    elapsed = seed(app, args.rows, days=args.days, seed_value=args.seed)
+    print(f"✅ {args.rows} rows seeded in {elapsed:.1f}s ({os.environ['DATABASE_DIR']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,41 @@
+from flask import g
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from sqlalchemy.orm import Session
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
+
+
+def apply_sqlite_pragmas(dbapi_conn, connection_record, cache_kib=8192, mmap_mb=256, query_only=False):
+    """Engine "connect" hook: WAL + tuned pragmas on every new SQLite connection."""
+    cur = dbapi_conn.cursor()
+    # WAL: القرّاء لا ينتظرون الكاتب، و synchronous=NORMAL آمن مع WAL
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA busy_timeout=5000")
+    # cache_size خاص بكل اتصال، أما mmap فصفحاته مشتركة بين كل الاتصالات والعمّال (page cache)
+    cur.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+    cur.execute(f"PRAGMA mmap_size={int(mmap_mb) * 1024 * 1024}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    if query_only:
+        cur.execute("PRAGMA query_only=ON")
+    cur.close()
+
+
+def analytics_session() -> Session:
+    """
+    Session on the read-only "analytics" engine (its own pool, query_only
+    connections), one per app context: long admin scans (exports, response
+    browser, crosstab cube) don't hold connections of the request pool.
+    """
+    if "analytics_session" not in g:
+        g.analytics_session = Session(db.engines["analytics"])
+    return g.analytics_session
+
+
+def close_analytics_session(exc=None) -> None:
+    session = g.pop("analytics_session", None)
+    if session is not None:
+        session.close()
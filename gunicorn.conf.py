@@ -1,8 +1,18 @@
 import os
 import multiprocessing
+import subprocess
+import sys
 
-workers = max(1, multiprocessing.cpu_count() * 2 + 1)
-worker_class = "sync"
+# sync (افتراضي): عملية لكل طلب متزامن. gthread: عمّال أقل وكل عامل بعدة خيوط
+# (GUNICORN_THREADS)، التطبيق آمن للخيوط (pool محدد الحجم، جلسة لكل طلب)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+if worker_class == "gthread":
+    threads = int(os.getenv("GUNICORN_THREADS", "8"))
+    # التطبيق يحدد حجم pool الاتصالات من عدد الخيوط (app.py)
+    os.environ["GUNICORN_THREADS"] = str(threads)
+    workers = int(os.getenv("GUNICORN_WORKERS", max(2, multiprocessing.cpu_count())))
+else:
+    workers = int(os.getenv("GUNICORN_WORKERS", max(1, multiprocessing.cpu_count() * 2 + 1)))
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
 timeout = 120
 keepalive = 5
@@ -10,3 +20,47 @@ accesslog = "-"
 errorlog = "-"
 loglevel = "info"
 proc_name = "survey_system"
+
+# التطبيق يُستورد مرة واحدة في الـ master والعمّال يتشاركون الذاكرة (copy-on-write)
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def on_starting(server):
+    # تجهيز القاعدة مرة واحدة لكل تشغيل، وليس في كل عامل
+    if os.getenv("SKIP_INIT_DB") == "1":
+        return
+    if not server.cfg.preload_app:
+        # بدون preload لا نستورد التطبيق في الـ master (حتى يعيد HUP تحميل الكود)
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"], check=True)
+        return
+    from app import app
+    from services.migrations import init_database
+    init_database(app)
+
+
+def worker_exit(server, worker):
+    # عدّادات العامل تُضاف لصف "retired" في metrics.db فلا ترجع للخلف ولا تبقى صفوفه
+    import sqlite3
+    from app import app
+    from services.metrics import retire
+    try:
+        retire(app.config["METRICS_PATH"])
+    except sqlite3.Error:
+        server.log.warning("metrics of worker %s were not retired", worker.pid)
+
+
+def post_fork(server, worker):
+    from gunicorn.workers.gthread import ThreadWorker
+    from app import app
+    # البث المباشر يبقى مفتوحًا فقط حين يحجز خيطًا لا عملية. نفحص العامل الفعلي،
+    # فـ "-k gthread" أو "--threads 4" في سطر الأوامر يُحسبان أيضًا
+    if "SSE_HOLD_SECONDS" not in os.environ and isinstance(worker, ThreadWorker):
+        app.config["SSE_HOLD_SECONDS"] = 25.0
+
+    # لا يستخدم العامل أي اتصال SQLite فتحه الـ master قبل fork
+    if not server.cfg.preload_app:
+        return
+    from extensions import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
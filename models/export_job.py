@@ -0,0 +1,27 @@
+from datetime import datetime
+from extensions import db
+
+class ExportJob(db.Model):
+    """
+    تقرير (Excel / PDF) يُجهَّز في الخلفية.
+    data_version = نسخة البيانات عند الطلب (أكبر id + جيل الاستعادة، services.stats.data_version)،
+    فنفس المدى + نفس النسخة = نفس الملف.
+    """
+    __table_args__ = (
+        db.Index("ix_export_job_lookup", "kind", "date_from", "date_to", "data_version"),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+
+    date_from = db.Column(db.Date, nullable=False)
+    date_to = db.Column(db.Date, nullable=False)
+    data_version = db.Column(db.String(64), nullable=False)
+
+    # queued -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    file_name = db.Column(db.String(255))
+    error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
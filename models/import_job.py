@@ -0,0 +1,24 @@
+from datetime import datetime
+from extensions import db
+
+class ImportJob(db.Model):
+    """
+    استيراد مجمّع لمشاركات ورقية (CSV / XLSX) يعمل في الخلفية.
+    processed_rows يتقدّم مع كل دفعة تُحفظ، و errors تحتفظ بأول IMPORT_MAX_ERRORS خطأ (JSON).
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # csv | xlsx
+    file_name = db.Column(db.String(255), nullable=False)  # اسم الملف كما رفعه الأدمن
+
+    # queued -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+
+    total_rows = db.Column(db.Integer)  # تقدير قبل البدء (قد يكون فارغًا)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    inserted_rows = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text)  # [{"row": n, "errors": [...]}, ...]
+    error = db.Column(db.Text)  # سبب فشل المهمة كلها
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,29 @@
+from extensions import db
+
+# الخيارات المسموحة لكل سؤال (الترتيب = الكود 1..n، نفس ترتيب الاستبيان)
+SURVEY_OPTIONS = {
+    "gender": ["ذكر", "انثى"],
+    "education_stage": ["اعدادية", "دبلوم", "بكالوريوس", "ماجستير"],
+    "satisfaction": ["راض جدا", "راض", "محايد", "غير راض", "غير راض جدا"],
+    "understanding_help": ["دائما", "غالبا", "احيانا", "نادرا", "ابدا"],
+    "device": ["هاتف محمول", "حاسوب", "جهاز لوحي"],
+    "internet_quality": ["ممتازة", "جيدة", "متوسطة", "ضعيفة"],
+    "platform_ease": ["سهلة جدا", "سهلة", "متوسطة", "صعبة"],
+    "teacher_interaction": ["مرتفع جدا", "مرتفع", "متوسط", "منخفض", "منخفض جدا"],
+    "study_preference": ["الكتروني", "حضوري", "مختلط"],
+    "continue_elearning": ["نعم", "الى حد ما", "لا"],
+}
+
+class SurveyOption(db.Model):
+    """
+    قاموس الخيارات: survey_response يخزن الكود (رقم صغير) بدل النص.
+    is_active=False للقيم القديمة التي وُجدت في البيانات عند الترحيل ولم تعد مقبولة في الإدخال.
+    """
+    __table_args__ = (
+        db.UniqueConstraint("question", "label", name="uq_survey_option_label"),
+    )
+
+    question = db.Column(db.String(50), primary_key=True)
+    code = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    label = db.Column(db.String(50), nullable=False)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
@@ -0,0 +1,19 @@
+from datetime import datetime
+from extensions import db
+
+class ResponsePartition(db.Model):
+    """
+    شهر مؤرشف من survey_response في ملف SQLite مستقل للقراءة فقط (database/archive/).
+    الصف يُضاف وصفوف الشهر تُحذف من app.db في نفس الـ transaction؛ الملف لا يتغير بعدها.
+    """
+    period = db.Column(db.String(7), primary_key=True)  # "YYYY-MM" بتوقيت بغداد
+    file_name = db.Column(db.String(255), nullable=False)  # responses-YYYY-MM.<stamp>.db[.gz]
+    compressed = db.Column(db.Boolean, nullable=False, default=False)
+
+    day_from = db.Column(db.Date, nullable=False)
+    day_to = db.Column(db.Date, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    min_id = db.Column(db.Integer)
+    max_id = db.Column(db.Integer)
+
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -1,22 +1,55 @@
 from datetime import datetime
 from extensions import db
+from utils import baghdad_day
+
+# الأسئلة التصنيفية (نفس ترتيب الاستبيان)
+QUESTION_FIELDS = (
+    "gender",
+    "education_stage",
+    "satisfaction",
+    "understanding_help",
+    "device",
+    "internet_quality",
+    "platform_ease",
+    "teacher_interaction",
+    "study_preference",
+    "continue_elearning",
+)
+
+def _default_local_day(context):
+    created_at = context.get_current_parameters().get("created_at") or datetime.utcnow()
+    return baghdad_day(created_at)
 
 class SurveyResponse(db.Model):
+    __table_args__ = (
+        # (created_at, id): ترتيب ثابت للتصفح بالـ keyset وفلاتر التاريخ
+        db.Index("ix_survey_response_created_at_id", "created_at", "id"),
+        *(
+            db.Index(f"ix_survey_response_local_day_{q}", "local_day", q)
+            for q in QUESTION_FIELDS
+        ),
+        # AUTOINCREMENT: ids of archived rows (services/partitions.py) are never reused
+        {"sqlite_autoincrement": True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
-    gender = db.Column(db.String(30), nullable=False)
-    education_stage = db.Column(db.String(50), nullable=False)
+    # كل عمود تصنيفي = كود من survey_option (انظر models/option.py)
+    gender = db.Column(db.SmallInteger, nullable=False)
+    education_stage = db.Column(db.SmallInteger, nullable=False)
 
-    satisfaction = db.Column(db.String(50), nullable=False)
-    understanding_help = db.Column(db.String(50), nullable=False)
+    satisfaction = db.Column(db.SmallInteger, nullable=False)
+    understanding_help = db.Column(db.SmallInteger, nullable=False)
 
-    device = db.Column(db.String(50), nullable=False)
-    internet_quality = db.Column(db.String(50), nullable=False)
+    device = db.Column(db.SmallInteger, nullable=False)
+    internet_quality = db.Column(db.SmallInteger, nullable=False)
 
-    platform_ease = db.Column(db.String(50), nullable=False)
-    teacher_interaction = db.Column(db.String(50), nullable=False)
+    platform_ease = db.Column(db.SmallInteger, nullable=False)
+    teacher_interaction = db.Column(db.SmallInteger, nullable=False)
 
-    study_preference = db.Column(db.String(50), nullable=False)
-    continue_elearning = db.Column(db.String(50), nullable=False)
+    study_preference = db.Column(db.SmallInteger, nullable=False)
+    continue_elearning = db.Column(db.SmallInteger, nullable=False)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # يوم بتوقيت بغداد (created_at + 3h) مخزّن حتى تستخدم فلاتر التاريخ الفهارس
+    local_day = db.Column(db.Date, default=_default_local_day, nullable=False)
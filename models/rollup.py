@@ -0,0 +1,14 @@
+from extensions import db
+
+class SurveyRollup(db.Model):
+    """
+    عدّادات بحسب الساعة أو الأسبوع (بتوقيت بغداد) لكل (سؤال، خيار) — نفس فكرة survey_tally
+    (وهو جدول الأيام). bucket = بداية الساعة، أو يوم الاثنين 00:00 لبداية الأسبوع.
+    تتحدث مع كل مشاركة داخل نفس الـ transaction.
+    """
+    grain = db.Column(db.String(10), primary_key=True)  # "hour" | "week"
+    question = db.Column(db.String(50), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    option = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)  # survey_option.code
+
+    count = db.Column(db.Integer, nullable=False, default=0)
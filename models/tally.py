@@ -0,0 +1,12 @@
+from extensions import db
+
+class SurveyTally(db.Model):
+    """
+    عدّاد جاهز لكل (سؤال، خيار، يوم بتوقيت بغداد).
+    يتحدث مع كل مشاركة داخل نفس الـ transaction، واللوحة تقرأ منه بدل مسح الجدول.
+    """
+    question = db.Column(db.String(50), primary_key=True)
+    option = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)  # survey_option.code
+    day = db.Column(db.Date, primary_key=True)
+
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -1,144 +1,144 @@
-from flask import Blueprint, render_template, request, send_file
+from flask import (
+    Blueprint, Response, abort, current_app, flash, jsonify, redirect, render_template, request, send_file,
+    stream_with_context, url_for,
+)
 from flask_login import login_required
-from sqlalchemy import func
-from datetime import datetime, time
-from io import BytesIO
+from werkzeug.utils import secure_filename
+from datetime import datetime, timezone
+from io import BytesIO, StringIO
+import csv
+import json
+import tempfile
+import time
 
 from extensions import db
 from utils import roles_required
-from models.response import SurveyResponse
-
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-
-
-from io import BytesIO
-from pathlib import Path
-
-from flask import send_file, request, current_app
-from sqlalchemy import func
-
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from reportlab.lib import colors
-
-import arabic_reshaper
-from bidi.algorithm import get_display
-from flask import redirect, url_for
-
-
-import os
-from pathlib import Path
-from datetime import datetime
-
-from flask import current_app, send_file, request, redirect, url_for, flash
-from werkzeug.utils import secure_filename
+from models.response import QUESTION_FIELDS
+from services.stats import dashboard_stats, data_version
+from services.live import delta_since
+from services.exports import write_xlsx, iter_csv, iter_ndjson, gzip_chunks, XLSX_MIMETYPE
+from services.reports import write_pdf, PDF_MIMETYPE
+from services.jobs import (
+    EXPORT_KINDS, submit_export, recent_jobs, job_path, download_name, mimetype_for,
+)
+from models.export_job import ExportJob
+from models.import_job import ImportJob
+from services.imports import import_kind, job_errors, recent_imports, submit_import
+from services.options import option_labels
+from services.tallies import response_count
+from services.trends import GRANULARITIES, MAX_BUCKETS, bucket_count, response_trend
+from services.metrics import observe_export
+from services.profiling import profiles_dir, recent_profiles
+from services.browser import browse_responses, decode_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.backups import (
+    get_sqlite_db_path, ensure_backups_dir, create_backup, validate_backup, prune_backups,
+    apply_backup,
+)
 
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
+# الملفات المؤقتة للتصدير تبقى في الذاكرة حتى 8MB ثم تنتقل للقرص
+EXPORT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
 
-admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+MAX_CROSSTAB_DIMS = 4
 
 @admin_bp.route("/dashboard")
 @login_required
 @roles_required("admin")
 def dashboard():
-    total = db.session.query(func.count(SurveyResponse.id)).scalar() or 0
+    # الأرقام محسوبة مرة واحدة لكل نسخة بيانات ومشتركة بين العمّال،
+    # والجارتات تُحمَّل من /admin/api/stats
+    stats = json.loads(dashboard_stats()[0])
 
-    # Distributions (counts)
-    gender_counts = dict(
-        db.session.query(SurveyResponse.gender, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.gender).all()
-    )
-    stage_counts = dict(
-        db.session.query(SurveyResponse.education_stage, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.education_stage).all()
-    )
-    satisfaction_counts = dict(
-        db.session.query(SurveyResponse.satisfaction, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.satisfaction).all()
-    )
-    understanding_counts = dict(
-        db.session.query(SurveyResponse.understanding_help, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.understanding_help).all()
-    )
-    device_counts = dict(
-        db.session.query(SurveyResponse.device, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.device).all()
-    )
-    internet_counts = dict(
-        db.session.query(SurveyResponse.internet_quality, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.internet_quality).all()
-    )
-    platform_counts = dict(
-        db.session.query(SurveyResponse.platform_ease, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.platform_ease).all()
-    )
-    interaction_counts = dict(
-        db.session.query(SurveyResponse.teacher_interaction, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.teacher_interaction).all()
-    )
-    preference_counts = dict(
-        db.session.query(SurveyResponse.study_preference, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.study_preference).all()
-    )
-    continue_counts = dict(
-        db.session.query(SurveyResponse.continue_elearning, func.count(SurveyResponse.id))
-        .group_by(SurveyResponse.continue_elearning).all()
-    )
-
-    # Last 7 days trend (Baghdad date)
-    # We use SQLite date() + timezone shift for better matching
-    baghdad_day = func.date(func.datetime(SurveyResponse.created_at, "+3 hours"))
-    last_days = db.session.query(baghdad_day, func.count(SurveyResponse.id))\
-        .group_by(baghdad_day)\
-        .order_by(baghdad_day.desc())\
-        .limit(7).all()
-
-    # reverse to show oldest->newest
-    last_days = list(reversed(last_days))
-    trend_labels = [d for d, _ in last_days]
-    trend_values = [c for _, c in last_days]
-
-    # Latest items
-    latest = SurveyResponse.query.order_by(SurveyResponse.created_at.desc()).limit(10).all()
-
-    # KPIs (simple “top” values)
-    def top3(d):
-        return sorted(d.items(), key=lambda x: x[1], reverse=True)[:3]
-
-    kpis = {
-        "top_device": top3(device_counts),
-        "top_stage": top3(stage_counts),
-        "top_preference": top3(preference_counts),
-        "top_satisfaction": top3(satisfaction_counts),
-    }
+    # Latest items (may come from an archived month on a quiet survey)
+    latest, _ = browse_responses(limit=10)
 
     return render_template(
         "admin_dashboard.html",
-        total=total,
-        gender_counts=gender_counts,
-        stage_counts=stage_counts,
-        satisfaction_counts=satisfaction_counts,
-        understanding_counts=understanding_counts,
-        device_counts=device_counts,
-        internet_counts=internet_counts,
-        platform_counts=platform_counts,
-        interaction_counts=interaction_counts,
-        preference_counts=preference_counts,
-        continue_counts=continue_counts,
-        trend_labels=trend_labels,
-        trend_values=trend_values,
+        total=stats["total"],
         latest=latest,
-        kpis=kpis,
+        kpis=stats["kpis"],
+        jobs=recent_jobs(),
+        imports=recent_imports(),
+        profiles=recent_profiles(limit=10),
     )
 
-def _parse_range(f, t):
-    df = datetime.strptime(f, "%Y-%m-%d").date()
-    dt = datetime.strptime(t, "%Y-%m-%d").date()
-    return datetime.combine(df, time.min), datetime.combine(dt, time.max)
+@admin_bp.route("/api/stats")
+@login_required
+@roles_required("admin")
+def stats_api():
+    """Dashboard aggregates as JSON; ETag/Last-Modified follow the data version."""
+    text, version, updated_at = dashboard_stats()
+
+    resp = Response(text, content_type="application/json")
+    resp.set_etag(f"stats-{version}")
+    resp.last_modified = datetime.fromtimestamp(updated_at, tz=timezone.utc)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+@admin_bp.route("/api/stream")
+@login_required
+@roles_required("admin")
+def stats_stream():
+    """
+    Server-Sent Events with dashboard increments.
+
+    Answers with what changed since Last-Event-ID (the data_version
+    watermark: max response id + restore generation), then keeps the stream open for up to SSE_HOLD_SECONDS,
+    sending new increments as they are committed (checked every
+    SSE_POLL_MS), and closes; the browser's EventSource reconnects after
+    `retry` ms. With SSE_HOLD_SECONDS=0 (the default for sync workers, where
+    an open stream would hold a whole process) every request answers at
+    once, i.e. polling every `retry` ms.
+    """
+    cfg = current_app.config
+    last = request.headers.get("Last-Event-ID") or request.args.get("since", "")
+
+    if not last:
+        watermark = data_version()
+        event, payload = "hello", {"watermark": watermark}
+    else:
+        event, payload, watermark = delta_since(last)
+    first = f"retry: {cfg['SSE_RETRY_MS']}\n" + _sse_event(event, payload, watermark)
+
+    hold = cfg["SSE_HOLD_SECONDS"]
+    poll = cfg["SSE_POLL_MS"] / 1000
+
+    def events():
+        nonlocal watermark
+        yield first
+        deadline = time.monotonic() + hold
+        while (remaining := deadline - time.monotonic()) > 0:
+            # الاتصال يرجع للـ pool أثناء الانتظار، الخيط وحده يبقى محجوزًا
+            db.session.close()
+            time.sleep(min(poll, remaining))
+            event, payload, watermark = delta_since(watermark)
+            if payload is not None:
+                yield _sse_event(event, payload, watermark)
+
+    return Response(
+        stream_with_context(events()),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _sse_event(event, payload, watermark):
+    if payload is None:
+        return f"id: {watermark}\n: no changes\n\n"
+    return f"id: {watermark}\nevent: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _parse_days(f, t):
+    """
+    'YYYY-MM-DD' strings from the export forms -> (date_from, date_to) as
+    Baghdad days (compared against SurveyResponse.local_day), or None if invalid.
+    """
+    try:
+        df = datetime.strptime(f, "%Y-%m-%d").date()
+        dt = datetime.strptime(t, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+    return df, dt
 
 @admin_bp.route("/export/excel")
 @login_required
@@ -147,214 +147,110 @@ def export_excel():
     date_from = request.args.get("from", "")
     date_to = request.args.get("to", "")
 
-    start_dt, end_dt = _parse_range(date_from, date_to)
-
-    items = (
-        SurveyResponse.query
-        .filter(SurveyResponse.created_at >= start_dt, SurveyResponse.created_at <= end_dt)
-        .order_by(SurveyResponse.created_at.asc())
-        .all()
-    )
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Survey Responses"
-
-    title = f"Survey Report ({date_from} to {date_to})"
-    ws.merge_cells("A1:L12")
-    ws["A1"] = title
-    ws["A1"].font = Font(bold=True, size=14)
-    ws["A1"].alignment = Alignment(horizontal="center", vertical="center")
-
-    headers = [
-    "ID",
-    "الجنس",
-    "المرحلة الدراسية",
-    "الرضا عن التعلم الإلكتروني",
-    "هل يساعدك على فهم المادة؟",
-    "الجهاز المستخدم",
-    "جودة الانترنت",
-    "سهولة المنصة",
-    "التفاعل مع المدرس",
-    "تفضيل الدراسة",
-    "الاستمرار بالتعلم الإلكتروني",
-    "التاريخ",
-]
-
-    ws.append(headers)
-
-    header_fill = PatternFill("solid", fgColor="EEF2FF")
-    thin = Side(style="thin", color="CBD5E1")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    for col in range(1, len(headers) + 1):
-        cell = ws.cell(row=2, column=col)
-        cell.font = Font(bold=True)
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = border
-
-    for r in items:
-        ws.append([
-        r.id,
-        r.gender,
-        r.education_stage,
-        r.satisfaction,
-        r.understanding_help,
-        r.device,
-        r.internet_quality,
-        r.platform_ease,
-        r.teacher_interaction,
-        r.study_preference,
-        r.continue_elearning,
-        r.created_at.strftime("%Y-%m-%d %H:%M"),
-    ])
-
-
-    for row in ws.iter_rows(min_row=3, max_row=ws.max_row, min_col=1, max_col=len(headers)):
-        for cell in row:
-            cell.alignment = Alignment(vertical="top", wrap_text=True)
-            cell.border = border
-
-    widths = [6, 10, 14, 20, 20, 14, 14, 14, 16, 14, 18, 18]
-
-    for i, w in enumerate(widths, start=1):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = w
-
-    ws.freeze_panes = "A3"
-
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+    days = _parse_days(date_from, date_to)
+    if days is None:
+        return redirect(url_for("admin.dashboard"))
+    day_from, day_to = days
+
+    # مدى كبير يحجز العامل دقائق: يُحوَّل لمهمة خلفية (لوحة الأدمن تستخدمها دائمًا)
+    limit = current_app.config["INLINE_EXPORT_MAX_ROWS"]
+    if limit and response_count(day_from, day_to) > limit:
+        job = submit_export("excel", day_from, day_to)
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(_job_json(job)), 202
+        flash("المدى كبير، يتم تجهيز ملف Excel في الخلفية ويظهر رابطه في قسم التقارير.", "success")
+        return redirect(url_for("admin.dashboard", _anchor="jobs"))
+
+    # نفس منطق PDF (تاريخ بغداد) عبر عمود local_day المفهرس.
+    # الملف يُكتب صفًا بصف إلى ملف مؤقت (في الذاكرة حتى حد معيّن ثم على القرص)
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_MEMORY)
+    write_xlsx(spool, day_from, day_to, title=f"Survey Report ({date_from} to {date_to})")
+    observe_export("excel", spool.tell())
+    spool.seek(0)
 
     filename = f"survey_report_{date_from}_to_{date_to}.xlsx"
     return send_file(
-        bio,
+        spool,
         as_attachment=True,
         download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        mimetype=XLSX_MIMETYPE,
     )
-def _ar(text: str) -> str:
-    if text is None:
-        text = ""
-    return get_display(arabic_reshaper.reshape(str(text)))
-@admin_bp.route("/export/pdf")
+def _counted(chunks, kind):
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        yield chunk
+    observe_export(kind, total)
+
+def _stream_export(chunks, filename, mimetype):
+    """Streams a byte-chunk generator as a download, gzipped on the fly with ?gzip=1."""
+    kind = filename.rsplit(".", 1)[-1]
+    if request.args.get("gzip") in ("1", "true", "yes"):
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+        kind += ".gz"
+    chunks = _counted(chunks, kind)
+
+    return Response(
+        stream_with_context(chunks),
+        content_type=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            # لا نريد أي proxy أن يجمع الرد كاملاً قبل إرساله
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+@admin_bp.route("/export/csv")
 @login_required
 @roles_required("admin")
-def export_pdf():
+def export_csv():
     date_from = request.args.get("from", "")
     date_to = request.args.get("to", "")
 
-    if not date_from or not date_to:
-        # يرجع المستخدم للداش بورد بدون كسر
+    days = _parse_days(date_from, date_to)
+    if days is None:
         return redirect(url_for("admin.dashboard"))
 
-    # نفس منطق Excel (تاريخ بغداد)
-    baghdad_date = func.date(func.datetime(SurveyResponse.created_at, "+3 hours"))
+    return _stream_export(
+        iter_csv(*days),
+        f"survey_responses_{date_from}_to_{date_to}.csv",
+        "text/csv; charset=utf-8",
+    )
+
+@admin_bp.route("/export/ndjson")
+@login_required
+@roles_required("admin")
+def export_ndjson():
+    date_from = request.args.get("from", "")
+    date_to = request.args.get("to", "")
+
+    days = _parse_days(date_from, date_to)
+    if days is None:
+        return redirect(url_for("admin.dashboard"))
 
-    items = (
-        SurveyResponse.query
-        .filter(baghdad_date >= date_from, baghdad_date <= date_to)
-        .order_by(SurveyResponse.created_at.asc())
-        .all()
+    return _stream_export(
+        iter_ndjson(*days),
+        f"survey_responses_{date_from}_to_{date_to}.ndjson",
+        "application/x-ndjson",
     )
 
-    def count_by(col):
-        return dict(
-            db.session.query(col, func.count(SurveyResponse.id))
-            .filter(baghdad_date >= date_from, baghdad_date <= date_to)
-            .group_by(col)
-            .all()
-        )
-
-    # إحصائيات
-    gender = count_by(SurveyResponse.gender)
-    stage = count_by(SurveyResponse.education_stage)
-    satisfaction = count_by(SurveyResponse.satisfaction)
-    understanding = count_by(SurveyResponse.understanding_help)
-    device = count_by(SurveyResponse.device)
-    internet = count_by(SurveyResponse.internet_quality)
-    platform = count_by(SurveyResponse.platform_ease)
-    interaction = count_by(SurveyResponse.teacher_interaction)
-    preference = count_by(SurveyResponse.study_preference)
-    cont = count_by(SurveyResponse.continue_elearning)
-
-    # ✅ Register Tajawal font (embedded in PDF)
-    font_path = Path(current_app.root_path) / "static" / "fonts" / "Tajawal-Regular.ttf"
-    if font_path.exists():
-        pdfmetrics.registerFont(TTFont("Tajawal", str(font_path)))
-        base_font = "Tajawal"
-    else:
-        base_font = "Helvetica"  # fallback
+@admin_bp.route("/export/pdf")
+@login_required
+@roles_required("admin")
+def export_pdf():
+    date_from = request.args.get("from", "")
+    date_to = request.args.get("to", "")
+
+    days = _parse_days(date_from, date_to)
+    if days is None:
+        # يرجع المستخدم للداش بورد بدون كسر
+        return redirect(url_for("admin.dashboard"))
 
     bio = BytesIO()
-    c = canvas.Canvas(bio, pagesize=A4)
-    w, h = A4
-
-    def draw_title(txt, y):
-        c.setFont(base_font, 18)
-        c.setFillColor(colors.HexColor("#0F172A"))
-        c.drawRightString(w - 2*cm, y, _ar(txt))
-
-    def draw_sub(txt, y):
-        c.setFont(base_font, 12)
-        c.setFillColor(colors.HexColor("#475569"))
-        c.drawRightString(w - 2*cm, y, _ar(txt))
-
-    def draw_section(txt, y):
-        c.setFont(base_font, 14)
-        c.setFillColor(colors.HexColor("#0F172A"))
-        c.drawRightString(w - 2*cm, y, _ar(txt))
-        c.setStrokeColor(colors.HexColor("#CBD5E1"))
-        c.line(2*cm, y-6, w-2*cm, y-6)
-
-    def draw_kv(dic, y, max_rows=10):
-        c.setFont(base_font, 12)
-        c.setFillColor(colors.HexColor("#0F172A"))
-        items_sorted = sorted(dic.items(), key=lambda x: x[1], reverse=True)
-        if not items_sorted:
-            c.drawRightString(w - 2*cm, y, _ar("لا توجد بيانات"))
-            return y - 18
-
-        for i, (k, v) in enumerate(items_sorted[:max_rows]):
-            c.drawRightString(w - 2*cm, y - i*16, _ar(f"{k} : {v}"))
-        return y - min(len(items_sorted), max_rows)*16 - 8
-
-    # Header
-    draw_title("تقرير إحصائيات الاستبيان", h - 2.2*cm)
-    draw_sub(f"الفترة: {date_from}  إلى  {date_to}", h - 3.1*cm)
-    draw_sub(f"عدد المشاركات: {len(items)}", h - 3.8*cm)
-
-    y = h - 5.0*cm
-
-    # Sections (multiple pages)
-    blocks = [
-        ("الجنس", gender),
-        ("المرحلة الدراسية", stage),
-        ("الرضا عن التعلم الإلكتروني", satisfaction),
-        ("هل يساعد على فهم المادة؟", understanding),
-        ("الجهاز المستخدم", device),
-        ("جودة الإنترنت", internet),
-        ("سهولة المنصة", platform),
-        ("التفاعل مع المدرس", interaction),
-        ("تفضيل طريقة الدراسة", preference),
-        ("الاستمرار بالتعلم الإلكتروني", cont),
-    ]
-
-    for label, data in blocks:
-        if y < 5.2*cm:
-            c.showPage()
-            y = h - 3*cm
-
-        draw_section(label, y)
-        y = draw_kv(data, y - 22)
-
-    # Footer
-    c.setFont(base_font, 10)
-    c.setFillColor(colors.HexColor("#64748B"))
-    c.drawString(2*cm, 1.6*cm, _ar("تم إنشاء هذا التقرير تلقائيًا من نظام الاستبيان."))
-
-    c.save()
+    write_pdf(bio, *days)
+    observe_export("pdf", bio.tell())
     bio.seek(0)
 
     filename = f"survey_report_{date_from}_to_{date_to}.pdf"
@@ -362,48 +258,292 @@ def export_pdf():
         bio,
         as_attachment=True,
         download_name=filename,
-        mimetype="application/pdf"
+        mimetype=PDF_MIMETYPE
+    )
+def _job_json(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "from": job.date_from.isoformat(),
+        "to": job.date_to.isoformat(),
+        "status": job.status,
+        "error": job.error,
+        "download_url": (
+            url_for("admin.download_job", job_id=job.id) if job.status == "done" else None
+        ),
+    }
+
+@admin_bp.route("/jobs/export", methods=["POST"])
+@login_required
+@roles_required("admin")
+def submit_export_job():
+    kind = request.form.get("kind", "")
+    days = _parse_days(request.form.get("from", ""), request.form.get("to", ""))
+    if days is None or kind not in EXPORT_KINDS:
+        flash("رجاءً اختر نوع التقرير والتاريخين بشكل صحيح.", "error")
+        return redirect(url_for("admin.dashboard"))
+
+    job = submit_export(kind, *days)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(_job_json(job)), 202
+    if job.status == "done":
+        # نفس المدى ونفس البيانات: الملف جاهز
+        return redirect(url_for("admin.download_job", job_id=job.id))
+    return redirect(url_for("admin.dashboard", _anchor="jobs"))
+
+@admin_bp.route("/jobs/<job_id>")
+@login_required
+@roles_required("admin")
+def job_status(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None:
+        abort(404)
+    return jsonify(_job_json(job))
+
+@admin_bp.route("/jobs/<job_id>/download")
+@login_required
+@roles_required("admin")
+def download_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None or job.status != "done" or not job_path(job).exists():
+        abort(404)
+    return send_file(
+        job_path(job),
+        as_attachment=True,
+        download_name=download_name(job),
+        mimetype=mimetype_for(job),
+    )
+
+def _import_json(job):
+    return {
+        "id": job.id,
+        "file": job.file_name,
+        "status": job.status,
+        "total": job.total_rows,
+        "processed": job.processed_rows,
+        "inserted": job.inserted_rows,
+        "rejected": job.error_count,
+        "error": job.error,
+        "errors_url": (
+            url_for("admin.import_errors", job_id=job.id) if job.error_count else None
+        ),
+    }
+
+@admin_bp.route("/imports", methods=["POST"])
+@login_required
+@roles_required("admin")
+def submit_import_job():
+    limit = current_app.config["IMPORT_MAX_MB"] * 1024 * 1024
+    if request.content_length and request.content_length > limit:
+        flash(f"الملف أكبر من {current_app.config['IMPORT_MAX_MB']}MB.", "error")
+        return redirect(url_for("admin.dashboard", _anchor="imports"))
+
+    file = request.files.get("import_file")
+    if not file or file.filename.strip() == "":
+        flash("رجاءً اختر ملف CSV أو Excel.", "error")
+        return redirect(url_for("admin.dashboard", _anchor="imports"))
+    if import_kind(file.filename) is None:
+        flash("الملف يجب أن يكون بصيغة .csv أو .xlsx", "error")
+        return redirect(url_for("admin.dashboard", _anchor="imports"))
+
+    job = submit_import(file)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(_import_json(job)), 202
+    return redirect(url_for("admin.dashboard", _anchor="imports"))
+
+@admin_bp.route("/imports/<job_id>")
+@login_required
+@roles_required("admin")
+def import_status(job_id):
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        abort(404)
+    return jsonify(_import_json(job))
+
+@admin_bp.route("/imports/<job_id>/errors.csv")
+@login_required
+@roles_required("admin")
+def import_errors(job_id):
+    """Rejected rows of an import (row number as in the uploaded sheet + reasons)."""
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        abort(404)
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["row", "errors"])
+    for e in job_errors(job):
+        writer.writerow([e["row"], "; ".join(e["errors"])])
+    return Response(
+        buf.getvalue().encode("utf-8-sig"),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=import_{job.id}_errors.csv"},
     )
-def _get_sqlite_db_path() -> Path:
+
+@admin_bp.route("/api/crosstab")
+@login_required
+@roles_required("admin")
+def crosstab_api():
+    """
+    Cross-tab over any questions, e.g.
+    /admin/api/crosstab?dims=satisfaction,device&from=2024-01-01&to=2024-06-30&gender=انثى
+    Any question name used as a parameter filters on those option labels.
+    """
+    dims = [d for d in request.args.get("dims", "").split(",") if d]
+    if not dims or len(dims) > MAX_CROSSTAB_DIMS or any(d not in QUESTION_FIELDS for d in dims):
+        return jsonify({"error": f"dims: 1-{MAX_CROSSTAB_DIMS} of {list(QUESTION_FIELDS)}"}), 400
+
+    day_from = day_to = None
+    if request.args.get("from") or request.args.get("to"):
+        days = _parse_days(request.args.get("from", ""), request.args.get("to", ""))
+        if days is None:
+            return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+        day_from, day_to = days
+
+    labels = option_labels()
+    filters = {}
+    for q in QUESTION_FIELDS:
+        wanted = set(request.args.getlist(q))
+        if wanted:
+            filters[q] = [code for code, label in labels[q].items() if label in wanted]
+
+    # numpy + المكعب يُحمَّلان فقط عند أول جدول تقاطعي في هذا العامل
+    from services.analytics import get_cube, chi_square
+
+    cube = get_cube()
+    counts, axes = cube.crosstab(dims, day_from, day_to, filters)
+    test = chi_square(counts)
+
+    return jsonify({
+        "dims": dims,
+        "labels": [[labels[q][code] for code in axis] for q, axis in zip(dims, axes)],
+        "counts": counts.tolist(),
+        "total": int(counts.sum()),
+        "chi_square": (
+            {"statistic": test[0], "dof": test[1], "p_value": test[2]} if test else None
+        ),
+    })
+
+@admin_bp.route("/api/trend")
+@login_required
+@roles_required("admin")
+def trend_api():
+    """
+    Responses per hour/day/week (Baghdad time) with empty buckets as 0, e.g.
+    /admin/api/trend?granularity=week&from=2024-01-01&to=2024-06-30&by=device
+    """
+    granularity = request.args.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity: one of {list(GRANULARITIES)}"}), 400
+
+    days = _parse_days(request.args.get("from", ""), request.args.get("to", ""))
+    if days is None or days[0] > days[1]:
+        return jsonify({"error": "from/to must be YYYY-MM-DD with from <= to"}), 400
+    if bucket_count(granularity, *days) > MAX_BUCKETS:
+        return jsonify({"error": f"too many buckets (max {MAX_BUCKETS}), use a coarser granularity"}), 400
+
+    by = request.args.get("by") or None
+    if by is not None and by not in QUESTION_FIELDS:
+        return jsonify({"error": f"by: one of {list(QUESTION_FIELDS)}"}), 400
+
+    return jsonify(response_trend(granularity, *days, by=by))
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+    except ValueError:
+        return None
+
+def _response_json(r, labels):
+    return {
+        "id": r.id,
+        "created_at": r.created_at.isoformat(),
+        "local_day": r.local_day.isoformat(),
+        **{q: labels[q].get(getattr(r, q), "") for q in QUESTION_FIELDS},
+    }
+
+@admin_bp.route("/responses")
+@login_required
+@roles_required("admin")
+def browse():
     """
-    Extracts sqlite DB file path from SQLALCHEMY_DATABASE_URI
-    Example: sqlite:////opt/render/project/src/database/app.db
+    Filterable response browser, newest first, e.g.
+    /admin/responses?from=2024-01-01&to=2024-06-30&device=موبايل&format=json
+    Pages continue with ?cursor=<next> (keyset on created_at, id — no OFFSET).
     """
-    uri = current_app.config.get("SQLALCHEMY_DATABASE_URI", "")
-    if not uri.startswith("sqlite:///"):
-        raise RuntimeError("Backup/Restore supported only for SQLite in this project.")
-    # uri after sqlite:/// is a filesystem path
-    path_str = uri.replace("sqlite:///", "", 1)
-    return Path(path_str)
-
-def _ensure_backups_dir() -> Path:
-    d = Path(current_app.root_path) / "backups"
-    d.mkdir(parents=True, exist_ok=True)
-    return d
+    wants_json = (
+        request.args.get("format") == "json"
+        or request.accept_mimetypes.best == "application/json"
+    )
+
+    day_from = _parse_day(request.args.get("from", ""))
+    day_to = _parse_day(request.args.get("to", ""))
+    limit = min(max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    after = None
+    if request.args.get("cursor"):
+        after = decode_cursor(request.args["cursor"])
+        if after is None:
+            if wants_json:
+                return jsonify({"error": "invalid cursor"}), 400
+            abort(400)
+
+    labels = option_labels()
+    filters = {}
+    for q in QUESTION_FIELDS:
+        wanted = set(request.args.getlist(q)) - {""}
+        if wanted:
+            filters[q] = [code for code, label in labels[q].items() if label in wanted]
+
+    rows, next_cursor = browse_responses(day_from, day_to, filters, after, limit)
+
+    args = request.args.to_dict(flat=False)
+    args.pop("cursor", None)
+    first_url = url_for("admin.browse", **args) if after is not None else None
+    next_url = url_for("admin.browse", **args, cursor=next_cursor) if next_cursor else None
+
+    if wants_json:
+        return jsonify({
+            "rows": [_response_json(r, labels) for r in rows],
+            "next_cursor": next_cursor,
+            "next_url": next_url,
+        })
+
+    return render_template(
+        "responses.html",
+        rows=rows,
+        next_url=next_url,
+        labels=labels,
+        args=request.args,
+        first_url=first_url,
+    )
+
+@admin_bp.route("/profiles/<name>")
+@login_required
+@roles_required("admin")
+def download_profile(name):
+    path = profiles_dir() / secure_filename(name)
+    if not path.is_file():
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=path.name,
+                     mimetype="application/octet-stream")
+
 @admin_bp.route("/backup/download")
 @login_required
 @roles_required("admin")
 def download_backup():
-    db_path = _get_sqlite_db_path()
+    db_path = get_sqlite_db_path()
     if not db_path.exists():
         flash("قاعدة البيانات غير موجودة!", "error")
         return redirect(url_for("admin.dashboard"))
 
-    backups_dir = _ensure_backups_dir()
-    ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    backup_name = f"backup_{ts}.db"
-    backup_path = backups_dir / backup_name
-
-    # افصل السيشن للتأكد
-    db.session.remove()
-
-    # نسخ الملف (copy bytes)
-    backup_path.write_bytes(db_path.read_bytes())
+    # نسخة متسقة عبر SQLite backup API بدون إيقاف الكتابة، ثم تُبث من القرص
+    backup_path = create_backup()
+    prune_backups()
 
     return send_file(
         backup_path,
         as_attachment=True,
-        download_name=backup_name,
+        download_name=backup_path.name,
         mimetype="application/octet-stream"
     )
 @admin_bp.route("/backup/restore", methods=["POST"])
@@ -420,29 +560,27 @@ def restore_backup():
         flash("الملف يجب أن يكون بصيغة .db", "error")
         return redirect(url_for("admin.dashboard"))
 
-    db_path = _get_sqlite_db_path()
-    backups_dir = _ensure_backups_dir()
+    backups_dir = ensure_backups_dir()
 
     # احفظ النسخة المرفوعة أولاً داخل backups
     ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     uploaded_path = backups_dir / f"uploaded_{ts}_{filename}"
     file.save(uploaded_path)
 
-    # حاول تفريغ/إغلاق الاتصالات قبل الاستبدال
-    try:
-        db.session.remove()
-        db.engine.dispose()
-    except Exception:
-        pass
+    # تحقق من سلامة الملف والجداول قبل لمس قاعدة البيانات الحالية
+    problems = validate_backup(uploaded_path)
+    if problems:
+        uploaded_path.unlink(missing_ok=True)
+        flash("❌ ملف النسخة الاحتياطية غير صالح: " + "؛ ".join(problems), "error")
+        return redirect(url_for("admin.dashboard"))
 
     # احتفظ بنسخة أمان من DB الحالية قبل الاستبدال
-    if db_path.exists():
-        safety_copy = backups_dir / f"before_restore_{ts}.db"
-        safety_copy.write_bytes(db_path.read_bytes())
+    if get_sqlite_db_path().exists():
+        create_backup(prefix="before_restore")
 
-    # استبدال DB الحالية بالملف المرفوع
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    db_path.write_bytes(uploaded_path.read_bytes())
+    # استبدال المحتوى في transaction واحدة، وبقية العمّال يلتقطون التغيير تلقائيًا
+    apply_backup(uploaded_path)
+    prune_backups()
 
-    flash("✅ تمت استعادة النسخة الاحتياطية بنجاح. يُفضّل إعادة تشغيل الخدمة إن كنت على استضافة.", "success")
+    flash("✅ تمت استعادة النسخة الاحتياطية بنجاح.", "success")
     return redirect(url_for("admin.dashboard"))
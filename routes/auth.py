@@ -1,21 +1,51 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import math
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from werkzeug.security import check_password_hash
 from flask_login import login_user, logout_user
 
 from models.user import User
+from services.metrics import registry
+from services.ratelimit import hit, peek, reset
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
+def _account_key(email):
+    # الحساب + IP: محاولات خاطئة من جهاز آخر لا تقفل الحساب على صاحبه
+    return f"login:account:{email}:{request.remote_addr}"
+
+def _login_throttled(email):
+    """
+    Seconds until another attempt is allowed (0 = go ahead). Every attempt
+    counts against the IP; only failed ones count against (account, IP).
+    """
+    cfg = current_app.config
+    return max(
+        hit(f"login:ip:{request.remote_addr}", cfg["LOGIN_MAX_PER_IP"], cfg["LOGIN_WINDOW"]),
+        peek(_account_key(email), cfg["LOGIN_MAX_PER_ACCOUNT"]),
+    )
+
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = (request.form.get("email") or "").strip().lower()
         password = request.form.get("password") or ""
 
+        # الحد يُفحص قبل أي استعلام أو hash، فسيل المحاولات لا يحجز العمّال
+        wait = _login_throttled(email)
+        if wait:
+            registry.inc("survey_login_throttled_total")
+            minutes = math.ceil(wait / 60)
+            flash(f"محاولات دخول كثيرة، حاول مرة أخرى بعد {minutes} دقيقة.")
+            return render_template("login.html"), 429, {"Retry-After": str(math.ceil(wait))}
+
         user = User.query.filter_by(email=email).first()
         if user and check_password_hash(user.password, password):
+            reset(_account_key(email))
             login_user(user)
             return redirect(url_for("admin.dashboard"))
+        cfg = current_app.config
+        hit(_account_key(email), cfg["LOGIN_MAX_PER_ACCOUNT"], cfg["LOGIN_WINDOW"])
         flash("بيانات الدخول غير صحيحة")
 
     return render_template("login.html")
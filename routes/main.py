@@ -1,34 +1,75 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from extensions import db
-from models.response import SurveyResponse
+import math
+import re
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session
+from services.ingest import SavePending, save_response
+from services.metrics import registry
+from services.options import encode_answers
+from services.pages import cached_page
+from services.ratelimit import claim, release, take
 
 main_bp = Blueprint("main", __name__)
 
+# form_token من survey.html (32 hex)؛ أي قيمة أخرى = بدون مفتاح
+_FORM_TOKEN = re.compile(r"[A-Za-z0-9_-]{16,64}")
+
+def _submit_wait():
+    """Seconds until this IP may submit again (0 = go ahead); spends one token."""
+    cfg = current_app.config
+    return take(f"submit:ip:{request.remote_addr}", cfg["SUBMIT_RATE_PER_MIN"] / 60, cfg["SUBMIT_BURST"])
+
 @main_bp.route("/", methods=["GET", "POST"])
 def survey():
     if request.method == "POST":
-        payload = SurveyResponse(
-            gender=request.form.get("gender"),
-            education_stage=request.form.get("education_stage"),
-            satisfaction=request.form.get("satisfaction"),
-            understanding_help=request.form.get("understanding_help"),
-            device=request.form.get("device"),
-            internet_quality=request.form.get("internet_quality"),
-            platform_ease=request.form.get("platform_ease"),
-            teacher_interaction=request.form.get("teacher_interaction"),
-            study_preference=request.form.get("study_preference"),
-            continue_elearning=request.form.get("continue_elearning"),
-        )
-
-        db.session.add(payload)
-        db.session.commit()
-        return render_template("survey.html", success=True)
-
-    return render_template("survey.html", success=False)
+        # الحد والتكرار يُفحصان قبل أي كتابة في app.db
+        wait = _submit_wait()
+        if wait:
+            registry.inc("survey_submit_throttled_total")
+            flash("طلبات كثيرة من نفس الشبكة، حاول مرة أخرى بعد قليل.")
+            return render_template("survey.html", success=False), 429, {"Retry-After": str(math.ceil(wait))}
+
+        # نقبل فقط الخيارات الموجودة في القاموس، ونخزن الكود بدل النص
+        values, errors = encode_answers(request.form)
+        if errors:
+            flash("رجاءً اختر إجابة صحيحة لكل الأسئلة.")
+            return render_template("survey.html", success=False), 400
+
+        token = request.form.get("form_token", "")
+        key = f"submit:form:{token}" if _FORM_TOKEN.fullmatch(token) else None
+        if key and not claim(key, current_app.config["SUBMIT_TOKEN_TTL"]):
+            # نفس النموذج وصل مرة ثانية: نفس صفحة الشكر بدون حفظ جديد
+            registry.inc("survey_submit_duplicates_total")
+            return _page("survey_success", "survey.html", success=True)
+        values["created_at"] = datetime.utcnow()
+
+        try:
+            save_response(values, key)
+        except SavePending:
+            # النتيجة غير معروفة (الدفعة قد تُحفظ بعد قليل): المفتاح يبقى محجوزًا
+            # فإعادة الإرسال لا تُنشئ نسخة ثانية
+            registry.inc("survey_submit_pending_total")
+            return render_template("survey.html", success=False, pending=True), 202
+        except Exception:
+            if key:
+                release(key)  # لم يُحفظ شيء، المحاولة التالية بنفس النموذج مقبولة
+            raise
+        return _page("survey_success", "survey.html", success=True)
+
+    # رسالة flash معلّقة تجعل الصفحة خاصة بهذا الزائر، فلا نستخدم النسخة الجاهزة
+    if session.get("_flashes"):
+        return render_template("survey.html", success=False)
+    return _page("survey", "survey.html", success=False)
 
 @main_bp.route("/about")
 def about():
-    return render_template("about.html")
+    return _page("about", "about.html")
+
+
+def _page(name, template, **context):
+    if not current_app.config["PAGE_CACHE"]:
+        return render_template(template, **context)
+    return cached_page(name, template, **context)
 
 
 @main_bp.route("/health")
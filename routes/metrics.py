@@ -0,0 +1,28 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+from flask_login import current_user
+
+from services.metrics import render_prometheus
+
+metrics_bp = Blueprint("metrics", __name__)
+
+@metrics_bp.route("/metrics")
+def metrics():
+    """Prometheus text format, summed over all gunicorn workers."""
+    # Prometheus لا يملك جلسة دخول، فنقبل أيضًا Bearer token من الإعدادات
+    token = current_app.config["METRICS_TOKEN"]
+    auth = request.headers.get("Authorization", "")
+    bearer_ok = bool(token) and hmac.compare_digest(auth, f"Bearer {token}")
+
+    if not bearer_ok:
+        if not current_user.is_authenticated:
+            abort(401)
+        if current_user.role != "admin":
+            abort(403)
+
+    return Response(
+        render_prometheus(current_app.config["METRICS_PATH"]),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+        headers={"Cache-Control": "no-store"},
+    )
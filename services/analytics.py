@@ -0,0 +1,217 @@
+"""
+In-memory columnar snapshot of survey_response for cross-tab analytics.
+
+Each process keeps one code array per question (uint8) plus a Baghdad-day
+array (date ordinals). New rows are appended incrementally using the
+response id as a watermark, so a refresh only reads rows inserted since the
+previous one; archived months are read from their files once, on the
+first load and whenever another month gets archived. Contingency tables
+for any set of questions are a single np.bincount over the combined code
+index.
+"""
+import math
+import threading
+
+import numpy as np
+
+from extensions import analytics_session, db
+from models.response import QUESTION_FIELDS, SurveyResponse
+from services.backups import on_restore
+from services.options import option_labels
+from services.partitions import archived_partitions, archived_tables
+from services.stats import max_response_id
+
+_INITIAL_CAPACITY = 1024
+
+
+class ResponseCube:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self.watermark = 0
+        self.periods = []  # archived months loaded (services/partitions.py)
+        self.days = np.empty(_INITIAL_CAPACITY, dtype=np.int32)
+        self.codes = np.empty((len(QUESTION_FIELDS), _INITIAL_CAPACITY), dtype=np.uint8)
+
+    # ------------------------------------------------------------------
+    # Incremental load
+    # ------------------------------------------------------------------
+
+    def _grow(self, needed):
+        capacity = self.days.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        days = np.empty(capacity, dtype=np.int32)
+        codes = np.empty((len(QUESTION_FIELDS), capacity), dtype=np.uint8)
+        days[:self.size] = self.days[:self.size]
+        codes[:, :self.size] = self.codes[:, :self.size]
+        self.days, self.codes = days, codes
+
+    def _append(self, session, stmt, chunk_size):
+        for partition in session.execute(stmt.execution_options(yield_per=chunk_size)).partitions():
+            rows = np.array(
+                [(r[0], r[1].toordinal(), *r[2:]) for r in partition], dtype=np.int64
+            )
+            start, end = self.size, self.size + len(rows)
+            self._grow(end)
+            self.days[start:end] = rows[:, 1]
+            self.codes[:, start:end] = rows[:, 2:].T
+            self.size = end
+            yield int(rows[-1, 0])
+
+    @staticmethod
+    def _columns(table):
+        return db.select(table.c.id, table.c.local_day, *(table.c[q] for q in QUESTION_FIELDS))
+
+    def refresh(self, chunk_size=5000):
+        """Appends responses with id > watermark. Cheap when nothing changed."""
+        with self._lock:
+            # المسح الكامل على المحرك القرائي (analytics)، لا يشغل اتصالات الطلبات
+            session = analytics_session()
+            latest = max_response_id()
+            periods = [p.period for p in archived_partitions(session=session)]
+            if latest < self.watermark or periods != self.periods:
+                # البيانات استُبدلت (استعادة نسخة) أو أُرشف شهر — نبدأ من جديد
+                self.reset()
+                # الأشهر المؤرشفة لا تتغير: تُقرأ مرة واحدة بدون watermark
+                for _, table in archived_tables(session):
+                    for _ in self._append(session, self._columns(table), chunk_size):
+                        pass
+                self.periods = periods
+            if latest == self.watermark:
+                return
+
+            main = SurveyResponse.__table__
+            stmt = self._columns(main).where(main.c.id > self.watermark).order_by(main.c.id)
+            for last_id in self._append(session, stmt, chunk_size):
+                self.watermark = last_id
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _mask(self, day_from=None, day_to=None, filters=None):
+        days = self.days[:self.size]
+        mask = np.ones(self.size, dtype=bool)
+        if day_from is not None:
+            mask &= days >= day_from.toordinal()
+        if day_to is not None:
+            mask &= days <= day_to.toordinal()
+        for q, codes in (filters or {}).items():
+            column = self.codes[QUESTION_FIELDS.index(q), :self.size]
+            mask &= np.isin(column, list(codes))
+        return mask
+
+    def crosstab(self, dims, day_from=None, day_to=None, filters=None):
+        """
+        N-dimensional contingency table over `dims` (question names).
+        Returns (counts ndarray, axes) where axes[i] is the list of codes
+        along dimension i (codes that exist in the option dictionary).
+        """
+        labels = option_labels()
+        sizes = [max(labels[q], default=0) + 1 for q in dims]
+
+        with self._lock:
+            mask = self._mask(day_from, day_to, filters)
+            flat = np.zeros(int(mask.sum()), dtype=np.int64)
+            for q, size in zip(dims, sizes):
+                column = self.codes[QUESTION_FIELDS.index(q), :self.size][mask]
+                flat = flat * size + column
+
+        counts = np.bincount(flat, minlength=int(np.prod(sizes))).reshape(sizes)
+
+        # الكود 0 غير مستخدم، نعرض فقط الأكواد المعرّفة في القاموس
+        axes = [sorted(labels[q]) for q in dims]
+        counts = counts[np.ix_(*axes)] if dims else counts
+        return counts, axes
+
+
+def chi_square(counts):
+    """
+    Pearson chi-square test of mutual independence for an N-D table.
+    Empty levels are ignored. Returns (statistic, dof, p_value) or None.
+    """
+    total = counts.sum()
+    if counts.ndim < 2 or total == 0:
+        return None
+
+    # احذف المستويات الفارغة من كل بُعد
+    for axis in range(counts.ndim):
+        other = tuple(a for a in range(counts.ndim) if a != axis)
+        keep = counts.sum(axis=other) > 0
+        counts = np.compress(keep, counts, axis=axis)
+
+    expected = np.full(counts.shape, float(total))
+    for axis in range(counts.ndim):
+        other = tuple(a for a in range(counts.ndim) if a != axis)
+        marginal = counts.sum(axis=other) / total
+        shape = [1] * counts.ndim
+        shape[axis] = -1
+        expected = expected * marginal.reshape(shape)
+
+    dof = int(np.prod(counts.shape)) - 1 - sum(k - 1 for k in counts.shape)
+    if dof <= 0:
+        return None
+
+    statistic = float(((counts - expected) ** 2 / expected).sum())
+    return statistic, dof, _chi2_sf(statistic, dof)
+
+
+def _chi2_sf(x, dof):
+    """Chi-square survival function via the regularized upper incomplete gamma Q(k/2, x/2)."""
+    a, x = dof / 2.0, x / 2.0
+    if x <= 0:
+        return 1.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+
+    if x < a + 1:
+        # series for P(a, x)
+        term = total = 1.0 / a
+        n = a
+        for _ in range(1000):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-14:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+
+    # continued fraction for Q(a, x) (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-14:
+            break
+    return math.exp(log_prefix) * h
+
+
+_cube = ResponseCube()
+
+
+@on_restore
+def _reset_cube():
+    with _cube._lock:
+        _cube.reset()
+
+
+def get_cube() -> ResponseCube:
+    """The process-wide cube, brought up to date with survey_response."""
+    _cube.refresh()
+    return _cube
@@ -0,0 +1,65 @@
+"""
+Serves the fingerprinted bundle built by ``python -m assets.build``.
+
+static/dist/manifest.json maps logical names ("app.css", "chart.js",
+"img/ali.jpg") to content-hashed files; templates call
+``asset_url("app.css")``. Hashed files never change, so /assets/ answers
+with a one-year immutable Cache-Control and picks the precompressed .br/.gz
+sibling the client accepts.
+"""
+import json
+import mimetypes
+from pathlib import Path
+
+from flask import current_app, request, send_from_directory, url_for
+
+# سنة كاملة: أي تعديل يعطي اسم ملف جديد
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def dist_dir(app=None) -> Path:
+    return Path((app or current_app).static_folder) / "dist"
+
+
+def _load_manifest(app) -> dict:
+    path = dist_dir(app) / "manifest.json"
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        app.logger.warning("%s is missing; run `python -m assets.build`", path)
+        return {"assets": {}, "encodings": {}}
+
+
+def asset_url(name: str) -> str:
+    """URL of the current build of `name` (template global)."""
+    hashed = current_app.extensions["assets"]["assets"].get(name)
+    if hashed is None:
+        raise KeyError(f"{name} is not in static/dist/manifest.json; run `python -m assets.build`")
+    return url_for("assets", filename=hashed)
+
+
+def serve_asset(filename):
+    encodings = current_app.extensions["assets"]["encodings"].get(filename, ())
+    encoding = request.accept_encodings.best_match(encodings) if encodings else None
+
+    response = send_from_directory(
+        dist_dir(),
+        filename + _SUFFIXES.get(encoding, ""),
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        max_age=ASSET_MAX_AGE,
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app) -> None:
+    app.extensions["assets"] = _load_manifest(app)
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.jinja_env.globals["asset_url"] = asset_url
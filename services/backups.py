@@ -0,0 +1,208 @@
+"""
+Online backup / validated restore for the SQLite database.
+
+Both directions go through SQLite's online backup API, copying a few pages
+per step so writers in other workers are only blocked for short moments.
+A restore replaces the live database contents in a single transaction, so
+every worker keeps its connections and simply sees the restored data.
+Archived months (services/partitions.py) are not copied: their files never
+change once written, so a backup only lists them and a restore checks that
+they are still in place.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from flask import current_app
+
+from extensions import db
+from models.response import QUESTION_FIELDS
+
+# أعمدة لازم تكون موجودة في أي نسخة احتياطية صالحة (أقدم schema مدعوم)
+REQUIRED_COLUMNS = {
+    "survey_response": {"id", "created_at", *QUESTION_FIELDS},
+    "user": {"id", "name", "email", "password", "role"},
+}
+
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+
+
+def get_sqlite_db_path() -> Path:
+    """
+    Extracts sqlite DB file path from SQLALCHEMY_DATABASE_URI
+    Example: sqlite:////opt/render/project/src/database/app.db
+    """
+    uri = current_app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    if not uri.startswith("sqlite:///"):
+        raise RuntimeError("Backup/Restore supported only for SQLite in this project.")
+    # uri after sqlite:/// is a filesystem path
+    path_str = uri.replace("sqlite:///", "", 1)
+    return Path(path_str)
+
+
+def ensure_backups_dir() -> Path:
+    d = Path(current_app.root_path) / "backups"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _timestamp() -> str:
+    return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+
+
+def _online_copy(src_path: Path, dst_path: Path) -> None:
+    """Page-stepped sqlite3 backup from src_path into dst_path (created/overwritten)."""
+    src = sqlite3.connect(str(src_path))
+    dst = sqlite3.connect(str(dst_path))
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+        # ملف واحد مستقل (بدون -wal / -shm) حتى يُنزّل ويُرفع كما هو
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+
+
+def _open_readonly(path: Path):
+    # immutable: لا أقفال ولا ملفات -shm بجانب الملف المرفوع
+    return sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+
+
+def create_backup(prefix="backup") -> Path:
+    """Consistent snapshot of the live DB into backups/ (no full read into memory)."""
+    path = ensure_backups_dir() / f"{prefix}_{_timestamp()}.db"
+    tmp = path.with_name(path.name + ".part")
+    _online_copy(get_sqlite_db_path(), tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def validate_backup(path: Path) -> list:
+    """Returns a list of problems (empty list = usable backup)."""
+    try:
+        conn = _open_readonly(path)
+    except sqlite3.Error as e:
+        return [str(e)]
+
+    problems = []
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchall()
+        if result != [("ok",)]:
+            problems.extend(row[0] for row in result[:5])
+
+        for table, required in REQUIRED_COLUMNS.items():
+            cols = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+            if not cols:
+                problems.append(f"missing table: {table}")
+            elif required - cols:
+                problems.append(f"{table}: missing columns {sorted(required - cols)}")
+
+        # الأشهر المؤرشفة في النسخة تُقرأ من ملفات database/archive/ (لا تتغير بعد إنشائها)
+        archive_dir = Path(current_app.config["ARCHIVE_DIR"])
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'response_partition'"
+        ).fetchone():
+            for period, file_name in conn.execute("SELECT period, file_name FROM response_partition"):
+                if not (archive_dir / file_name).exists():
+                    problems.append(f"archived month {period}: missing {archive_dir / file_name}")
+    except sqlite3.DatabaseError as e:
+        problems.append(str(e))
+    finally:
+        conn.close()
+    return problems
+
+
+def apply_backup(path: Path) -> None:
+    """
+    Replaces the live database contents with `path` (already validated).
+
+    The copy into the live file is one write transaction: other connections
+    either see the old data or the restored data, never a mix. Afterwards
+    the schema is brought up to date and the restore generation is bumped so
+    every worker drops its pooled connections and per-process caches.
+    """
+    db.session.remove()
+
+    src = _open_readonly(path)
+    dst = sqlite3.connect(str(get_sqlite_db_path()), timeout=30)
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+    finally:
+        dst.close()
+        src.close()
+
+    for engine in db.engines.values():
+        engine.dispose()
+
+    # نسخة قديمة قد تفتقد أعمدة/جداول أحدث
+    from services.migrations import prepare_database
+    prepare_database()
+
+    bump_restore_generation()
+
+
+# ---------------------------------------------------------------------------
+# Restore generation: lets every worker notice a restore done by another one
+# ---------------------------------------------------------------------------
+
+_seen_generation = None
+_generation_lock = threading.Lock()
+_restore_hooks = []
+
+
+def on_restore(fn):
+    """Registers a callback that drops per-process state after a restore."""
+    _restore_hooks.append(fn)
+    return fn
+
+
+def _generation_marker() -> Path:
+    db_path = get_sqlite_db_path()
+    return db_path.with_name(db_path.name + ".restored")
+
+
+def bump_restore_generation() -> None:
+    _generation_marker().write_text(_timestamp())
+
+
+def restore_generation() -> int:
+    """Changes whenever a restore happened (in any worker)."""
+    try:
+        return _generation_marker().stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def prune_backups(keep=None) -> None:
+    """Retention: keeps only the newest `keep` (BACKUP_KEEP) .db files in backups/."""
+    if keep is None:
+        keep = current_app.config["BACKUP_KEEP"]
+    files = sorted(
+        ensure_backups_dir().glob("*.db"),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in files[keep:]:
+        old.unlink(missing_ok=True)
+
+
+def check_restore_generation() -> None:
+    """before_request hook: one stat() per request, resets state if a restore happened."""
+    global _seen_generation
+    current = restore_generation()
+    if current == _seen_generation:
+        return
+    # gthread: أكثر من thread قد يلاحظ الاستعادة معًا، والتصفير يتم مرة واحدة
+    with _generation_lock:
+        if _seen_generation is None:
+            _seen_generation = current
+            return
+        if current != _seen_generation:
+            _seen_generation = current
+            for engine in db.engines.values():
+                engine.dispose()
+            for fn in _restore_hooks:
+                fn()
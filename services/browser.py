@@ -0,0 +1,94 @@
+"""
+Admin response browser: filtered, keyset-paginated listing of survey_response.
+
+Pages are ordered newest first by (created_at, id) and continue from an
+opaque cursor holding the last row's key, so page 1000 is the same index
+range scan as page 1 (no OFFSET). Baghdad-day filters are turned into
+created_at bounds so the (created_at, id) index serves both the range and
+the order. Archived months are read from their own files, one month at a
+time, until the page is full (services/partitions.py).
+"""
+import base64
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import tuple_
+
+from extensions import analytics_session, db
+from models.response import QUESTION_FIELDS
+from services.partitions import response_segments, segment_select
+from utils import BAGHDAD_OFFSET, baghdad_day
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: datetime, response_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{response_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """-> (created_at, id), or None if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, response_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(response_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _utc_bounds(day_from, day_to):
+    """Baghdad days [day_from, day_to] -> naive UTC [start, end) for created_at."""
+    start = end = None
+    if day_from is not None:
+        start = datetime.combine(day_from, time.min) - BAGHDAD_OFFSET
+    if day_to is not None:
+        end = datetime.combine(day_to + timedelta(days=1), time.min) - BAGHDAD_OFFSET
+    return start, end
+
+
+def browse_responses(day_from=None, day_to=None, filters=None, after=None,
+                     limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of responses, newest first.
+
+    filters: {question: [code, ...]}; after: (created_at, id) from the
+    previous page's cursor. Returns (rows, next_cursor); next_cursor is
+    None on the last page.
+    """
+    session = analytics_session()
+    rows = []
+    for segment in response_segments(day_from, day_to, newest_first=True, session=session):
+        if after is not None and segment.day_from is not None and segment.day_from > baghdad_day(after[0]):
+            continue  # الشهر كله أحدث من المؤشر
+
+        def page(table, segment=segment):
+            stmt = db.select(table)
+            start, end = _utc_bounds(segment.day_from, segment.day_to)
+            if start is not None:
+                stmt = stmt.where(table.c.created_at >= start)
+            if end is not None:
+                stmt = stmt.where(table.c.created_at < end)
+
+            for q, codes in (filters or {}).items():
+                if q in QUESTION_FIELDS:
+                    stmt = stmt.where(table.c[q].in_(codes))
+
+            if after is not None:
+                stmt = stmt.where(tuple_(table.c.created_at, table.c.id) < after)
+            return stmt
+
+        # صف إضافي لمعرفة هل توجد صفحة تالية بدون COUNT
+        stmt = segment_select(
+            segment, page, order_by=("created_at", "id"), descending=True,
+            limit=limit + 1 - len(rows),
+        )
+        rows.extend(session.execute(stmt).all())
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
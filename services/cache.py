@@ -0,0 +1,66 @@
+"""
+Small key/value cache shared by all gunicorn workers of one host.
+
+Backed by its own SQLite file next to the main database (so cache writes
+never take the main write lock). Every entry carries the data version it
+was computed for; a lookup with a different version is a miss.
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from flask import current_app
+
+_local = threading.local()
+
+
+def _cache_path() -> Path:
+    return Path(current_app.config["SHARED_CACHE_PATH"])
+
+
+def _conn() -> sqlite3.Connection:
+    path = str(_cache_path())
+    conn = getattr(_local, "conn", None)
+    # اتصال لكل thread، ولا نستخدم اتصالاً موروثًا بعد fork
+    if conn is None or _local.path != path or _local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            " key TEXT PRIMARY KEY, version TEXT NOT NULL,"
+            " value TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        _local.conn, _local.path, _local.pid = conn, path, os.getpid()
+    return conn
+
+
+def cache_get(key: str, version: str):
+    """Returns (value, updated_at) if an entry for exactly this version exists, else None."""
+    row = _conn().execute(
+        "SELECT value, updated_at FROM shared_cache WHERE key = ? AND version = ?",
+        (key, version),
+    ).fetchone()
+    return row
+
+
+def cache_set(key: str, version: str, value: str) -> float:
+    now = time.time()
+    _conn().execute(
+        "INSERT INTO shared_cache (key, version, value, updated_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET version = excluded.version,"
+        " value = excluded.value, updated_at = excluded.updated_at",
+        (key, version, value, now),
+    )
+    return now
+
+
+def cached(key: str, version: str, compute):
+    """Returns (value, updated_at), computing and storing it on a miss."""
+    hit = cache_get(key, version)
+    if hit is not None:
+        return hit
+    value = compute()
+    return value, cache_set(key, version, value)
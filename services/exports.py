@@ -0,0 +1,169 @@
+"""
+Row sources and file writers shared by the admin exports.
+
+Rows are read from the database in chunks (yield_per) and written straight
+to the output, so memory stays flat however many responses the range holds.
+openpyxl is imported inside write_xlsx, on the first Excel export.
+"""
+import csv
+import io
+import json
+import zlib
+
+from extensions import analytics_session, db
+from models.response import QUESTION_FIELDS, SurveyResponse
+from services.options import option_labels
+from services.partitions import day_filter, response_segments, segment_select
+
+# (header, column) — نفس ترتيب وعناوين تقرير Excel
+EXPORT_COLUMNS = [
+    ("ID", SurveyResponse.id),
+    ("الجنس", SurveyResponse.gender),
+    ("المرحلة الدراسية", SurveyResponse.education_stage),
+    ("الرضا عن التعلم الإلكتروني", SurveyResponse.satisfaction),
+    ("هل يساعدك على فهم المادة؟", SurveyResponse.understanding_help),
+    ("الجهاز المستخدم", SurveyResponse.device),
+    ("جودة الانترنت", SurveyResponse.internet_quality),
+    ("سهولة المنصة", SurveyResponse.platform_ease),
+    ("التفاعل مع المدرس", SurveyResponse.teacher_interaction),
+    ("تفضيل الدراسة", SurveyResponse.study_preference),
+    ("الاستمرار بالتعلم الإلكتروني", SurveyResponse.continue_elearning),
+    ("التاريخ", SurveyResponse.created_at),
+]
+
+EXPORT_HEADERS = [h for h, _ in EXPORT_COLUMNS]
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+CHUNK_SIZE = 1000
+
+
+def iter_rows(day_from, day_to, chunk_size=CHUNK_SIZE):
+    """
+    Yields export rows (tuples in EXPORT_COLUMNS order) for a Baghdad-day
+    range, oldest first, archived months included (one segment at a time).
+    """
+    session = analytics_session()
+    keys = [col.key for _, col in EXPORT_COLUMNS]
+    for segment in response_segments(day_from, day_to, session=session):
+        stmt = segment_select(
+            segment,
+            lambda t: db.select(*(t.c[k] for k in keys)).where(
+                *day_filter(t, segment.day_from, segment.day_to)
+            ),
+            order_by=("created_at", "id"),
+        ).execution_options(yield_per=chunk_size)
+        for row in session.execute(stmt):
+            yield tuple(row)
+
+
+def format_created_at(value):
+    return value.strftime("%Y-%m-%d %H:%M")
+
+
+def _export_records(day_from, day_to):
+    # الأكواد تُحوَّل إلى نصوص هنا فقط (أعمدة الأسئلة بين ID والتاريخ)
+    labels = option_labels()
+    decoders = [labels[q] for q in QUESTION_FIELDS]
+    for row in iter_rows(day_from, day_to):
+        values = list(row)
+        for i, decode in enumerate(decoders, start=1):
+            values[i] = decode.get(values[i], "")
+        values[-1] = format_created_at(values[-1])
+        yield values
+
+
+def write_xlsx(fileobj, day_from, day_to, title):
+    """Writes the styled survey report to `fileobj` using openpyxl write-only mode."""
+    # openpyxl يُحمَّل عند أول تصدير فقط
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    thin = Side(style="thin", color="CBD5E1")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+    wb = openpyxl.Workbook(write_only=True)
+
+    # Named styles: تُسجَّل مرة واحدة في الملف بدل نسخة لكل خلية
+    wb.add_named_style(NamedStyle(
+        name="report_title",
+        font=Font(bold=True, size=14),
+        alignment=Alignment(horizontal="center", vertical="center"),
+    ))
+    wb.add_named_style(NamedStyle(
+        name="report_header",
+        font=Font(bold=True),
+        fill=PatternFill("solid", fgColor="EEF2FF"),
+        alignment=Alignment(horizontal="center", vertical="center"),
+        border=border,
+    ))
+    wb.add_named_style(NamedStyle(
+        name="report_cell",
+        alignment=Alignment(vertical="top", wrap_text=True),
+        border=border,
+    ))
+
+    ws = wb.create_sheet("Survey Responses")
+
+    # في وضع write-only يجب ضبط العرض والتجميد قبل كتابة أي صف
+    widths = [6, 10, 14, 20, 20, 14, 14, 14, 16, 14, 18, 18]
+    for i, w in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+    ws.freeze_panes = "A3"
+
+    last_col = get_column_letter(len(EXPORT_HEADERS))
+    ws.merged_cells.add(f"A1:{last_col}1")
+
+    def styled(value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    ws.append([styled(title, "report_title")])
+    ws.append([styled(h, "report_header") for h in EXPORT_HEADERS])
+
+    for values in _export_records(day_from, day_to):
+        ws.append([styled(v, "report_cell") for v in values])
+
+    wb.save(fileobj)
+
+
+def iter_csv(day_from, day_to, chunk_size=CHUNK_SIZE):
+    """Yields the CSV export as UTF-8 byte chunks (header row first)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_HEADERS)
+
+    for i, values in enumerate(_export_records(day_from, day_to), start=1):
+        writer.writerow(values)
+        if i % chunk_size == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_ndjson(day_from, day_to, chunk_size=CHUNK_SIZE):
+    """Yields one JSON object per response (keys = Excel headers) as byte chunks."""
+    lines = []
+    for values in _export_records(day_from, day_to):
+        lines.append(json.dumps(dict(zip(EXPORT_HEADERS, values)), ensure_ascii=False))
+        if len(lines) >= chunk_size:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def gzip_chunks(chunks, level=6):
+    """Compresses a byte-chunk stream on the fly into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
@@ -0,0 +1,307 @@
+"""
+Bulk import of paper responses typed into spreadsheets (CSV or XLSX).
+
+The upload is saved under imports/ and processed by the background pool
+(services.jobs). Rows are streamed (csv.reader / openpyxl read-only), each
+one is validated against the active options like a form submission, and
+valid rows are inserted with one executemany per IMPORT_CHUNK_SIZE rows.
+Every chunk commits together with its tally/rollup updates and the job's
+progress counters, so the dashboard can poll the job while it runs.
+
+Headers are the Excel/CSV export headers (or the column names); the ID
+column is ignored. "التاريخ" is optional: "YYYY-MM-DD HH:MM" as in the
+exports (UTC), or a bare date, which is stored as noon Baghdad time.
+"""
+import codecs
+import csv
+import json
+import uuid
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from extensions import db
+from models.import_job import ImportJob
+from models.response import QUESTION_FIELDS, SurveyResponse
+from services.exports import EXPORT_COLUMNS
+from services.options import encode_answers
+from services.tallies import bump_tallies
+from utils import BAGHDAD_OFFSET, baghdad_day
+
+# suffix -> kind
+IMPORT_KINDS = {".csv": "csv", ".xlsx": "xlsx"}
+
+# header text -> column key (export headers or plain column names)
+_COLUMNS = {
+    **{h: col.key for h, col in EXPORT_COLUMNS if col.key != "id"},
+    **{q: q for q in QUESTION_FIELDS},
+    "created_at": "created_at",
+}
+_HEADERS = {col.key: h for h, col in EXPORT_COLUMNS}
+
+# ملف Excel من التصدير يبدأ بصف عنوان، فنبحث عن صف العناوين في أول بضعة صفوف
+HEADER_SEARCH_ROWS = 5
+
+
+def imports_dir() -> Path:
+    d = Path(current_app.root_path) / "imports"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def upload_path(job: ImportJob) -> Path:
+    return imports_dir() / f"{job.id}.{job.kind}"
+
+
+def job_errors(job: ImportJob):
+    """[{"row": n, "errors": [message, ...]}, ...] (first IMPORT_MAX_ERRORS rows)"""
+    return json.loads(job.errors) if job.errors else []
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def _csv_encoding(path) -> str:
+    # Excel العربي يحفظ CSV أحيانًا بـ cp1256 بدل UTF-8
+    with open(path, "rb") as fh:
+        head = fh.read(64 * 1024)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return "cp1256"
+    return "utf-8-sig"
+
+
+class _Rows:
+    """Iterates (row number, cells) of the first sheet; `total` is a row-count estimate."""
+
+    def __init__(self, path, kind):
+        self.path, self.kind = path, kind
+        self.total = None
+        self._close = None
+
+    def __enter__(self):
+        if self.kind == "xlsx":
+            # openpyxl يُحمَّل عند أول استيراد فقط
+            import openpyxl
+            wb = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+            ws = wb.worksheets[0]
+            self.total = ws.max_row
+            self._cells = ws.iter_rows(values_only=True)
+            self._close = wb.close
+        else:
+            with open(self.path, "rb") as fh:
+                self.total = sum(block.count(b"\n") for block in iter(lambda: fh.read(1 << 20), b""))
+            fh = open(self.path, newline="", encoding=_csv_encoding(self.path), errors="replace")
+            first = fh.readline()
+            fh.seek(0)
+            delimiter = max(",;\t", key=first.count)
+            self._cells = csv.reader(fh, delimiter=delimiter)
+            self._close = fh.close
+        return self
+
+    def __exit__(self, *exc):
+        self._close()
+
+    def __iter__(self):
+        return enumerate(self._cells, start=1)
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _find_header(rows):
+    """Consumes rows up to the header; returns (header row number, column key per cell)."""
+    first_missing = None
+    for n, cells in rows:
+        columns = [_COLUMNS.get(_text(c)) for c in cells]
+        missing = [q for q in QUESTION_FIELDS if q not in columns]
+        if not missing:
+            return n, columns
+        if first_missing is None:
+            first_missing = missing
+        if n >= HEADER_SEARCH_ROWS:
+            break
+    names = "، ".join(_HEADERS[q] for q in first_missing or QUESTION_FIELDS)
+    raise ValueError(f"لم يتم العثور على صف العناوين؛ أعمدة ناقصة: {names}")
+
+
+def _parse_created_at(value, default, latest):
+    if value is None or _text(value) == "":
+        return default
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, time(12)) - BAGHDAD_OFFSET
+    else:
+        text = _text(value)
+        for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                pass
+        else:
+            # تاريخ بدون وقت = منتصف اليوم بتوقيت بغداد
+            parsed = datetime.combine(date.fromisoformat(text), time(12)) - BAGHDAD_OFFSET
+    if parsed > latest:
+        raise ValueError("future")
+    return parsed
+
+
+def _row_values(record, imported_at):
+    """Returns (values for survey_response, error messages) for one data row."""
+    values, bad = encode_answers({q: _text(record.get(q)) for q in QUESTION_FIELDS})
+    errors = [f"{_HEADERS[q]}: «{_text(record.get(q))}» ليس خيارًا مقبولًا" for q in bad]
+    try:
+        created_at = _parse_created_at(
+            record.get("created_at"), imported_at, imported_at + timedelta(days=1)
+        )
+    except ValueError:
+        errors.append(f"{_HEADERS['created_at']}: «{_text(record.get('created_at'))}» غير صالح")
+        created_at = None
+    if errors:
+        return None, errors
+    values["created_at"] = created_at
+    values["local_day"] = baghdad_day(created_at)
+    return values, []
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+def _save_chunk(job, batch, processed, error_count, errors):
+    if batch:
+        # executemany واحد للدفعة + العدّادات في نفس الـ transaction
+        db.session.execute(SurveyResponse.__table__.insert(), batch)
+        bump_tallies([SimpleNamespace(**values) for values in batch])
+    job.inserted_rows += len(batch)
+    job.processed_rows = processed
+    job.error_count = error_count
+    job.errors = json.dumps(errors, ensure_ascii=False)
+    db.session.commit()
+
+
+def _import_rows(job, path):
+    cfg = current_app.config
+    chunk_size, max_errors = cfg["IMPORT_CHUNK_SIZE"], cfg["IMPORT_MAX_ERRORS"]
+    imported_at = datetime.utcnow()
+
+    with _Rows(path, job.kind) as reader:
+        rows = iter(reader)
+        header_row, columns = _find_header(rows)
+        if reader.total:
+            job.total_rows = max(0, reader.total - header_row)
+            db.session.commit()
+
+        batch, errors = [], []
+        processed = error_count = 0
+        for n, cells in rows:
+            if not any(_text(c) for c in cells):
+                continue
+            record = {key: cell for key, cell in zip(columns, cells) if key}
+            values, messages = _row_values(record, imported_at)
+            processed += 1
+            if messages:
+                error_count += 1
+                if len(errors) < max_errors:
+                    errors.append({"row": n, "errors": messages})
+                continue
+            batch.append(values)
+            if len(batch) >= chunk_size:
+                _save_chunk(job, batch, processed, error_count, errors)
+                batch = []
+        _save_chunk(job, batch, processed, error_count, errors)
+
+
+def process_import(job: ImportJob, path) -> ImportJob:
+    """Imports `path` into survey_response, recording progress and errors on `job`."""
+    job.status = "running"
+    db.session.commit()
+    try:
+        _import_rows(job, path)
+    except Exception as e:
+        # الدفعات المحفوظة قبل الخطأ تبقى، والعدّادات تطابقها
+        db.session.rollback()
+        job.status = "failed"
+        job.error = str(e)[:1000]
+    else:
+        job.status = "done"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def _run_import(job_id: str) -> None:
+    """Runs inside a pool process."""
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        return
+    path = upload_path(job)
+    process_import(job, path)
+    path.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def import_kind(filename: str):
+    return IMPORT_KINDS.get(Path(filename or "").suffix.lower())
+
+
+def submit_import(upload) -> ImportJob:
+    """Saves an uploaded CSV/XLSX (werkzeug FileStorage) and queues its import."""
+    from services.jobs import run_in_background
+
+    kind = import_kind(upload.filename)
+    if kind is None:
+        raise ValueError(f"unsupported import file: {upload.filename}")
+
+    job = ImportJob(id=uuid.uuid4().hex, kind=kind, file_name=upload.filename[:255])
+    # الملف يُحفظ قبل إنشاء المهمة حتى لا تبدأ بدون ملف
+    upload.save(upload_path(job))
+    db.session.add(job)
+    db.session.commit()
+
+    run_in_background(_run_import, job.id)
+    return job
+
+
+def recent_imports(limit=5):
+    return ImportJob.query.order_by(ImportJob.created_at.desc()).limit(limit).all()
+
+
+@click.command("import-responses")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def import_responses_command(path):
+    """Import paper survey responses from a CSV or XLSX file."""
+    kind = import_kind(path)
+    if kind is None:
+        raise click.BadParameter("expected a .csv or .xlsx file", param_hint="PATH")
+
+    job = ImportJob(id=uuid.uuid4().hex, kind=kind, file_name=Path(path).name)
+    db.session.add(job)
+    db.session.commit()
+    process_import(job, path)
+
+    for e in job_errors(job)[:20]:
+        click.echo(f"row {e['row']}: " + "; ".join(e["errors"]))
+    if job.status == "failed":
+        raise click.ClickException(job.error)
+    click.echo(
+        f"✅ {job.inserted_rows} imported, {job.error_count} rejected"
+        f" ({job.processed_rows} rows read)"
+    )
@@ -0,0 +1,194 @@
+"""
+Group-commit write path for survey submissions.
+
+In "batched" mode each worker process puts validated responses on a local
+queue; one background thread drains it and writes them in a single
+transaction per batch (size or time threshold), so a burst of submissions
+costs one fsync per batch instead of one per student.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models.response import SurveyResponse
+from services.ratelimit import release
+from services.tallies import bump_tallies
+
+
+class SavePending(TimeoutError):
+    """The batch was not flushed in time; the response may still be committed."""
+
+
+class _Ticket:
+    """Handed back to the request; set once its batch is committed (or failed)."""
+
+    def __init__(self, values, form_key=None):
+        self.values = values
+        self.form_key = form_key
+        self.error = None
+        # True once nobody waits for the outcome (timeout / enqueue)
+        self.abandoned = False
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def resolve(self, error=None) -> bool:
+        """Sets the outcome; returns True if the request no longer waits for it."""
+        with self._lock:
+            self.error = error
+            self._done.set()
+            return self.abandoned
+
+    def wait(self, timeout):
+        if not self._done.wait(timeout):
+            with self._lock:
+                if not self._done.is_set():
+                    self.abandoned = True
+                    raise SavePending("survey batch was not flushed in time")
+        if self.error is not None:
+            raise self.error
+
+
+class BatchWriter:
+    def __init__(self, app, batch_size=50, flush_interval=0.2):
+        self.app = app
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.drain)
+
+    def submit(self, values, form_key=None, waited=True) -> _Ticket:
+        self._ensure_thread()
+        ticket = _Ticket(values, form_key)
+        ticket.abandoned = not waited
+        self._queue.put(ticket)
+        return ticket
+
+    def _ensure_thread(self):
+        # gunicorn يعمل fork بعد الاستيراد، فكل عامل يحتاج thread وطابور خاص به
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="survey-batch-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            self._flush(self._collect())
+
+    def _flush(self, batch):
+        with self.app.app_context():
+            try:
+                rows = [SurveyResponse(**t.values) for t in batch]
+                db.session.add_all(rows)
+                bump_tallies(rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                if len(batch) > 1 and not isinstance(e, OperationalError):
+                    # صف سيئ واحد (مثلًا IntegrityError) لا يُفشل طلبات الدفعة كلها: كل صف
+                    # يُعاد في transaction خاصة به. أخطاء القفل/القرص تخص الدفعة كلها فلا تُعاد
+                    self.app.logger.warning("survey batch of %d failed (%s), retrying row by row", len(batch), e)
+                    for t in batch:
+                        self._flush([t])
+                    return
+                self.app.logger.exception("survey batch of %d failed", len(batch))
+                for t in batch:
+                    # الطلب رجع قبل النتيجة فمفتاحه بقي محجوزًا: نحرّره حتى تُقبل إعادة الإرسال
+                    if t.resolve(e) and t.form_key:
+                        release(t.form_key)
+                return
+        for t in batch:
+            t.resolve()
+
+    def drain(self):
+        """Flushes whatever is still queued (called at worker exit)."""
+        if self._pid != os.getpid():
+            return
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(pending), self.batch_size):
+            self._flush(pending[i:i + self.batch_size])
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+# direct + gthread: خيوط العامل الواحد تصطف هنا بدل التنافس على قفل SQLite
+# (الـ busy handler ينام بفواصل متزايدة فيُجوِّع بعضها لثوانٍ)
+_direct_lock = threading.Lock()
+
+
+def _get_writer() -> BatchWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                cfg = current_app.config
+                _writer = BatchWriter(
+                    current_app._get_current_object(),
+                    batch_size=cfg["INGEST_BATCH_SIZE"],
+                    flush_interval=cfg["INGEST_FLUSH_INTERVAL"],
+                )
+    return _writer
+
+
+def save_response(values, form_key=None) -> None:
+    """
+    Persists one survey response according to INGEST_MODE / INGEST_DURABILITY.
+
+    direct   -> insert + commit in the request (default)
+    batched  -> queue for group commit; with durability "flush" the call
+                blocks until the batch is committed, with "enqueue" it
+                returns as soon as the response is queued
+
+    Raises SavePending when the flush wait times out: the outcome is unknown,
+    so the caller keeps `form_key` claimed; the writer releases it if the
+    batch fails after all.
+    """
+    cfg = current_app.config
+    if cfg["INGEST_MODE"] != "batched":
+        payload = SurveyResponse(**values)
+        # الإدخال + تحديث العدّادات في نفس الـ transaction
+        with _direct_lock:
+            db.session.add(payload)
+            bump_tallies([payload])
+            db.session.commit()
+        return
+
+    flush = cfg["INGEST_DURABILITY"] == "flush"
+    ticket = _get_writer().submit(values, form_key, waited=flush)
+    if flush:
+        ticket.wait(cfg["INGEST_FLUSH_TIMEOUT"])
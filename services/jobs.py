@@ -0,0 +1,198 @@
+"""
+Local background runner for Excel/PDF exports (and bulk imports).
+
+Each gunicorn worker lazily starts a small process pool; job state lives in
+the export_job / import_job tables so any worker can answer status polls and downloads.
+Finished files are kept under exports/ and reused when the same range is
+requested again at the same data version (max response id + restore
+generation).
+"""
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from flask import current_app
+
+from extensions import db
+from models.export_job import ExportJob
+from services.exports import write_xlsx, XLSX_MIMETYPE
+from services.metrics import flush as flush_metrics, observe_export
+from services.reports import write_pdf, PDF_MIMETYPE
+from services.stats import data_version
+
+
+def _write_excel(fileobj, day_from, day_to):
+    title = f"Survey Report ({day_from.isoformat()} to {day_to.isoformat()})"
+    write_xlsx(fileobj, day_from, day_to, title=title)
+
+
+# kind -> (writer, suffix, mimetype)
+EXPORT_KINDS = {
+    "excel": (_write_excel, ".xlsx", XLSX_MIMETYPE),
+    "pdf": (write_pdf, ".pdf", PDF_MIMETYPE),
+}
+
+# queued/running jobs older than this are treated as lost (e.g. the worker was killed)
+STALE_AFTER = timedelta(minutes=30)
+
+
+def exports_dir() -> Path:
+    d = Path(current_app.root_path) / "exports"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def job_path(job: ExportJob) -> Path:
+    return exports_dir() / job.file_name
+
+
+def mimetype_for(job: ExportJob) -> str:
+    return EXPORT_KINDS[job.kind][2]
+
+
+def download_name(job: ExportJob) -> str:
+    suffix = EXPORT_KINDS[job.kind][1]
+    return f"survey_report_{job.date_from.isoformat()}_to_{job.date_to.isoformat()}{suffix}"
+
+
+# ---------------------------------------------------------------------------
+# Process pool (one per gunicorn worker, created on first use)
+#
+# Pool processes are started with "spawn", not fork: the pool is created from
+# inside a running worker (gthread request threads, the batch writer, the
+# metrics flusher), and a forked child would inherit whatever locks those
+# threads held at that moment. A spawned child is a fresh interpreter that
+# imports the app itself (same environment, so same DATABASE_DIR/config).
+# ---------------------------------------------------------------------------
+
+_pool = None
+_pool_pid = None
+_pool_app = None
+_pool_lock = threading.Lock()
+
+
+def _init_pool_process():
+    # مفسّر جديد: التطبيق يُبنى هنا من نفس متغيرات البيئة، بلا خيوط أو اتصالات موروثة
+    global _pool_app
+    from app import app
+    _pool_app = app
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=current_app.config["EXPORT_JOB_WORKERS"],
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pool_process,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _call_in_app(fn, *args):
+    with _pool_app.app_context():
+        fn(*args)
+
+
+def run_in_background(fn, *args):
+    """Runs module-level `fn(*args)` in the pool, inside an app context."""
+    return _get_pool().submit(_call_in_app, fn, *args)
+
+
+def _run_job(job_id: str) -> None:
+    """Runs inside a pool process."""
+    with _pool_app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        if job is None:
+            return
+        job.status = "running"
+        db.session.commit()
+
+        writer, suffix, _ = EXPORT_KINDS[job.kind]
+        final = exports_dir() / f"{job.id}{suffix}"
+        tmp = final.with_name(final.name + ".part")
+        try:
+            with open(tmp, "wb") as fh:
+                writer(fh, job.date_from, job.date_to)
+            os.replace(tmp, final)
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            db.session.rollback()
+            job.status = "failed"
+            job.error = str(e)[:1000]
+        else:
+            job.status = "done"
+            job.file_name = final.name
+            observe_export(job.kind, final.stat().st_size)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        flush_metrics(current_app.config["METRICS_PATH"])
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def submit_export(kind: str, day_from, day_to) -> ExportJob:
+    """
+    Returns a finished job for the same range/data version if one exists
+    (cached artifact), an in-flight one if it is already being built,
+    or queues a new one.
+    """
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"unknown export kind: {kind}")
+
+    # يشمل جيل الاستعادة: بعد استعادة نسخة احتياطية لا يُقدَّم ملف من البيانات السابقة
+    version = data_version()
+    candidates = (
+        ExportJob.query
+        .filter_by(kind=kind, date_from=day_from, date_to=day_to, data_version=version)
+        .order_by(ExportJob.created_at.desc())
+        .all()
+    )
+    fresh_after = datetime.utcnow() - STALE_AFTER
+    for job in candidates:
+        if job.status == "done" and job_path(job).exists():
+            return job
+        if job.status in ("queued", "running") and job.created_at >= fresh_after:
+            return job
+
+    job = ExportJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        date_from=day_from,
+        date_to=day_to,
+        data_version=version,
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _get_pool().submit(_run_job, job.id)
+    prune_artifacts(current_app.config["EXPORT_CACHE_KEEP"])
+    return job
+
+
+def recent_jobs(limit=10):
+    return ExportJob.query.order_by(ExportJob.created_at.desc()).limit(limit).all()
+
+
+def prune_artifacts(keep: int) -> None:
+    """Keeps only the newest `keep` finished files in exports/."""
+    old = (
+        ExportJob.query
+        .filter(ExportJob.status == "done")
+        .order_by(ExportJob.created_at.desc())
+        .offset(keep)
+        .all()
+    )
+    for job in old:
+        job_path(job).unlink(missing_ok=True)
+        job.status = "expired"
+    if old:
+        db.session.commit()
@@ -0,0 +1,73 @@
+"""
+Incremental dashboard updates for the Server-Sent Events stream.
+
+The watermark is services.stats.data_version(), "<max response id>.<restore
+generation>": a client that last saw id N gets the responses with id > N as
+one delta (new ids, per-option count changes and per-day totals), and a
+client from before a restore is told to reload even if the restored snapshot
+ends at the same id. Works across workers because it only reads the database.
+"""
+from collections import Counter
+
+from extensions import db
+from models.response import QUESTION_FIELDS, SurveyResponse
+from services.backups import restore_generation
+from services.options import option_labels
+from services.stats import max_response_id
+
+# أكثر من هذا العدد من المشاركات الجديدة؟ الأسرع أن يعيد المتصفح تحميل /api/stats
+MAX_DELTA_ROWS = 500
+
+
+def parse_watermark(watermark: str):
+    """'<max id>.<restore generation>' -> (max id, generation), or None if malformed."""
+    last_id, sep, generation = watermark.partition(".")
+    if not (sep and last_id.isdigit() and generation.isdigit()):
+        return None
+    return int(last_id), int(generation)
+
+
+def delta_since(watermark: str):
+    """
+    Returns (event, payload, new_watermark):
+      ("noop", None, watermark)  nothing new
+      ("delta", {...}, current)  increments to apply in place
+      ("reset", {...}, current)  too many changes, data replaced (restore) or unknown watermark
+    """
+    latest, generation = max_response_id(), restore_generation()
+    current = f"{latest}.{generation}"
+    if watermark == current:
+        return "noop", None, watermark
+    parsed = parse_watermark(watermark)
+    # جيل استعادة مختلف = بيانات أخرى حتى لو انتهت لقطة النسخة بنفس الـ id
+    if (parsed is None or parsed[1] != generation
+            or latest < parsed[0] or latest - parsed[0] > MAX_DELTA_ROWS):
+        return "reset", {"watermark": current}, current
+    last_id = parsed[0]
+
+    rows = db.session.execute(
+        db.select(
+            SurveyResponse.id,
+            SurveyResponse.local_day,
+            *(getattr(SurveyResponse, q) for q in QUESTION_FIELDS),
+        )
+        .where(SurveyResponse.id > last_id, SurveyResponse.id <= latest)
+        .order_by(SurveyResponse.id)
+    ).all()
+
+    labels = option_labels()
+    changes = {q: Counter() for q in QUESTION_FIELDS}
+    days = Counter()
+    for row in rows:
+        days[row[1].isoformat()] += 1
+        for q, code in zip(QUESTION_FIELDS, row[2:]):
+            changes[q][labels[q].get(code, str(code))] += 1
+
+    payload = {
+        "watermark": current,
+        "ids": [row[0] for row in rows],
+        "total_added": len(rows),
+        "changes": {q: dict(c) for q, c in changes.items() if c},
+        "days": dict(days),
+    }
+    return "delta", payload, current
@@ -0,0 +1,445 @@
+"""
+Request/SQL instrumentation with a Prometheus text endpoint.
+
+Every process keeps its counters and histograms in memory (Flask request
+hooks, template signals, SQLAlchemy engine events) and a small background
+thread writes its absolute values to a shared SQLite file every few
+seconds, one row per (process, sample). /metrics sums the rows of all
+processes, so it shows the whole gunicorn pool whichever worker answers the
+scrape. When a process exits (or is found dead) its counters and histograms
+are folded into a "retired" row and its own rows are deleted, so totals
+never go backwards and the table does not grow with worker restarts.
+
+Requests slower than SLOW_REQUEST_MS are logged with their SQL statements,
+slowest first.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+# name -> (type, help, buckets or None)
+METRICS = {
+    "survey_http_requests_total": ("counter", "HTTP requests by endpoint, method and status.", None),
+    "survey_http_request_duration_seconds": ("histogram", "Time until the response object is ready.", LATENCY_BUCKETS),
+    "survey_request_db_queries": ("histogram", "SQL statements executed per request.", QUERY_COUNT_BUCKETS),
+    "survey_request_db_seconds": ("histogram", "Time spent in SQL per request.", LATENCY_BUCKETS),
+    "survey_template_render_seconds": ("histogram", "Jinja template rendering time.", LATENCY_BUCKETS),
+    "survey_db_queries_total": ("counter", "SQL statements executed (all threads).", None),
+    "survey_db_query_seconds_total": ("counter", "Time spent in SQL statements (all threads).", None),
+    "survey_db_lock_wait_seconds": (
+        "histogram", "First write statement of each transaction (SQLite write lock wait, incl. busy_timeout).",
+        LATENCY_BUCKETS,
+    ),
+    "survey_db_lock_errors_total": ("counter", "SQLite 'database is locked/busy' errors after busy_timeout.", None),
+    "survey_export_bytes": ("histogram", "Size of generated exports.", SIZE_BUCKETS),
+    "survey_slow_requests_total": ("counter", "Requests slower than SLOW_REQUEST_MS.", None),
+    "survey_login_throttled_total": ("counter", "Login attempts rejected by the limiter (before hashing).", None),
+    "survey_submit_throttled_total": ("counter", "Survey submissions rejected by the per-IP token bucket.", None),
+    "survey_submit_duplicates_total": ("counter", "Repeated survey submissions of the same form (not saved again).", None),
+    "survey_submit_pending_total": ("counter", "Batched submissions answered 202 before their batch was flushed.", None),
+}
+
+# كم جملة SQL نحتفظ بها لكل طلب (لسجل الطلبات البطيئة)
+MAX_STATEMENTS_PER_REQUEST = 200
+
+
+class Registry:
+    """In-process metric values; samples() flattens them Prometheus-style."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float)  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name, labels=(), value=1.0):
+        with self._lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, value, labels=()):
+        buckets = METRICS[name][2]
+        with self._lock:
+            h = self.histograms.get((name, labels))
+            if h is None:
+                h = self.histograms[(name, labels)] = [0] * (len(buckets) + 2)
+            for i, le in enumerate(buckets):
+                if value <= le:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def samples(self):
+        """[(sample name, label string, value)]"""
+        out = []
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                out.append((name, _labels(labels), value))
+            for (name, labels), h in self.histograms.items():
+                for le, n in zip(METRICS[name][2], h):
+                    out.append((f"{name}_bucket", _labels(labels + (("le", _num(le)),)), n))
+                out.append((f"{name}_bucket", _labels(labels + (("le", "+Inf"),)), h[-1]))
+                out.append((f"{name}_sum", _labels(labels), h[-2]))
+                out.append((f"{name}_count", _labels(labels), h[-1]))
+        return out
+
+
+def _num(v):
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+
+registry = Registry()
+
+
+def observe_export(kind: str, nbytes: int) -> None:
+    registry.observe("survey_export_bytes", nbytes, (("kind", kind),))
+
+
+# ---------------------------------------------------------------------------
+# Shared store (one SQLite file for all workers of this host)
+# ---------------------------------------------------------------------------
+
+_local = threading.local()
+
+# صفوف العمليات المنتهية تُجمع هنا (العدّادات لا ترجع للخلف بعد إعادة تشغيل عامل)
+RETIRED = "retired"
+
+_process = {"pid": None, "key": None, "retired": False}
+_process_lock = threading.Lock()
+
+
+def _process_key() -> str:
+    """"<pid>.<start ns>": a new process that reuses a pid never writes over the old one's rows."""
+    if _process["pid"] != os.getpid():
+        with _process_lock:
+            if _process["pid"] != os.getpid():
+                _process.update(pid=os.getpid(), key=f"{os.getpid()}.{time.time_ns()}", retired=False)
+    return _process["key"]
+
+
+def _conn(path) -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != path or _local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(metric_sample)")}
+        if columns and "proc" not in columns:
+            conn.execute("DROP TABLE metric_sample")  # صيغة قديمة (pid فقط)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS metric_sample ("
+            " proc TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL,"
+            " value REAL NOT NULL, PRIMARY KEY (proc, name, labels))"
+        )
+        _local.conn, _local.path, _local.pid = conn, path, os.getpid()
+    return conn
+
+
+def flush(path) -> None:
+    """Writes this process's current values (absolute, not deltas)."""
+    key = _process_key()
+    if _process["retired"]:
+        return
+    rows = [(key, name, labels, value) for name, labels, value in registry.samples()]
+    if not rows:
+        return
+    conn = _conn(path)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO metric_sample (proc, name, labels, value) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(proc, name, labels) DO UPDATE SET value = excluded.value",
+        rows,
+    )
+    conn.execute("COMMIT")
+
+
+def _base_name(name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+            return name[: -len(suffix)]
+    return name
+
+
+def _fold(conn, procs) -> None:
+    """Adds the counters/histograms of `procs` to the retired row and deletes their rows."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for proc in procs:
+            rows = conn.execute(
+                "SELECT name, labels, value FROM metric_sample WHERE proc = ?", (proc,)
+            ).fetchall()
+            # gauges تخص العملية الحية فقط فلا تُجمع
+            conn.executemany(
+                "INSERT INTO metric_sample (proc, name, labels, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(proc, name, labels) DO UPDATE SET value = value + excluded.value",
+                [
+                    (RETIRED, name, labels, value) for name, labels, value in rows
+                    if METRICS.get(_base_name(name), ("counter",))[0] != "gauge"
+                ],
+            )
+            conn.execute("DELETE FROM metric_sample WHERE proc = ?", (proc,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def retire(path) -> None:
+    """Final flush of this process, folded into the retired totals (worker exit)."""
+    if _process["pid"] != os.getpid() or _process["retired"]:
+        return
+    flush(path)
+    _process["retired"] = True
+    _fold(_conn(path), [_process["key"]])
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def prune(path) -> None:
+    """Folds the rows of processes that died without retiring (SIGKILL, pool children)."""
+    conn = _conn(path)
+    newest = {}  # pid -> newest key; older keys of the same pid belong to dead processes
+    stale = []
+    procs = [p for (p,) in conn.execute("SELECT DISTINCT proc FROM metric_sample") if p != RETIRED]
+    for proc in sorted(procs, key=lambda p: int(p.partition(".")[2] or 0)):
+        pid = int(proc.partition(".")[0])
+        if pid in newest:
+            stale.append(newest[pid])
+        newest[pid] = proc
+    own = _process_key()
+    stale += [
+        proc for pid, proc in newest.items()
+        if not _alive(pid) or (pid == os.getpid() and proc != own)
+    ]
+    if stale:
+        _fold(conn, stale)
+
+
+class _Flusher:
+    def __init__(self, path, interval):
+        self.path, self.interval = path, interval
+        self.pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        thread.start()
+        atexit.register(self._final)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                flush(self.path)
+            except sqlite3.Error:
+                pass
+
+    def _final(self):
+        if self.pid == os.getpid():
+            try:
+                retire(self.path)
+            except sqlite3.Error:
+                pass
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def _ensure_flusher(app):
+    global _flusher
+    # خيط لكل عملية (العامل بعد fork لا يرث الخيط)
+    if _flusher is None or _flusher.pid != os.getpid():
+        with _flusher_lock:
+            if _flusher is None or _flusher.pid != os.getpid():
+                _flusher = _Flusher(app.config["METRICS_PATH"], app.config["METRICS_FLUSH_INTERVAL"])
+
+
+def _sort_key(row):
+    # الـ buckets بترتيبها الرقمي وبعدها _sum و _count
+    name, labels, _ = row
+    head, sep, le = labels.rpartition('le="')
+    if name.endswith("_bucket") and sep:
+        le = le.rstrip('"')
+        return (name[:-7], head.rstrip(","), 0, float("inf") if le == "+Inf" else float(le))
+    for suffix, order in (("_sum", 1), ("_count", 2)):
+        if name.endswith(suffix):
+            return (name[: -len(suffix)], labels, order, 0.0)
+    return (name, labels, 0, 0.0)
+
+
+def render_prometheus(path) -> str:
+    """All workers' samples summed, in Prometheus text exposition format."""
+    flush(path)
+    prune(path)
+    rows = _conn(path).execute(
+        "SELECT name, labels, SUM(value) FROM metric_sample GROUP BY name, labels"
+    ).fetchall()
+    rows.sort(key=_sort_key)
+
+    by_metric = defaultdict(list)
+    for name, labels, value in rows:
+        by_metric[_base_name(name)].append((name, labels, value))
+
+    lines = []
+    for base, (kind, help_text, _) in METRICS.items():
+        lines.append(f"# HELP {base} {help_text}")
+        lines.append(f"# TYPE {base} {kind}")
+        for name, labels, value in by_metric.get(base, ()):
+            lines.append(f"{name}{{{labels}}} {_num(value)}" if labels else f"{name} {_num(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Hooks
+# ---------------------------------------------------------------------------
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = []
+    g.metrics_sql_count = 0
+    g.metrics_sql_time = 0.0
+
+
+def _after_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or "unmatched"
+    labels = (("endpoint", endpoint),)
+
+    registry.inc(
+        "survey_http_requests_total",
+        labels + (("method", request.method), ("status", str(response.status_code))),
+    )
+    registry.observe("survey_http_request_duration_seconds", elapsed, labels)
+    registry.observe("survey_request_db_queries", g.metrics_sql_count, labels)
+    registry.observe("survey_request_db_seconds", g.metrics_sql_time, labels)
+
+    if elapsed * 1000 >= current_app.config["SLOW_REQUEST_MS"]:
+        registry.inc("survey_slow_requests_total", labels)
+        _log_slow_request(endpoint, elapsed)
+
+    _ensure_flusher(current_app)
+    return response
+
+
+def _log_slow_request(endpoint, elapsed):
+    statements = sorted(g.metrics_sql, key=lambda s: s[0], reverse=True)[:10]
+    lines = [
+        f"slow request {request.method} {request.full_path.rstrip('?')} ({endpoint}):"
+        f" {elapsed * 1000:.0f} ms, {g.metrics_sql_count} queries,"
+        f" {g.metrics_sql_time * 1000:.0f} ms in SQL"
+    ]
+    for duration, statement in statements:
+        lines.append(f"  {duration * 1000:8.1f} ms  {' '.join(statement.split())[:500]}")
+    current_app.logger.warning("\n".join(lines))
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.metrics_render_started = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    if has_request_context() and "metrics_render_started" in g:
+        elapsed = time.perf_counter() - g.pop("metrics_render_started")
+        registry.observe(
+            "survey_template_render_seconds", elapsed, (("template", template.name or "string"),)
+        )
+
+
+# الجمل التي تطلب قفل الكتابة في SQLite (أول واحدة في المعاملة تنتظره)
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER", "BEGIN IMMEDIATE")
+
+
+def _is_write(statement) -> bool:
+    return statement.lstrip()[:15].upper().startswith(_WRITE_PREFIXES)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("metrics_started")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    registry.inc("survey_db_queries_total")
+    registry.inc("survey_db_query_seconds_total", value=elapsed)
+    if not conn.info.get("metrics_write_locked") and _is_write(statement):
+        # القفل يُحجز هنا حتى commit/rollback، فالجمل التالية لا تنتظره
+        conn.info["metrics_write_locked"] = True
+        registry.observe("survey_db_lock_wait_seconds", elapsed)
+
+    if has_request_context() and "metrics_sql" in g:
+        g.metrics_sql_count += 1
+        g.metrics_sql_time += elapsed
+        if len(g.metrics_sql) < MAX_STATEMENTS_PER_REQUEST:
+            g.metrics_sql.append((elapsed, statement))
+
+
+def _handle_error(context):
+    conn = context.connection
+    started = None
+    if conn is not None and conn.info.get("metrics_started"):
+        started = conn.info["metrics_started"].pop()
+    if isinstance(context.sqlalchemy_exception, OperationalError):
+        message = str(context.original_exception).lower()
+        if "locked" in message or "busy" in message:
+            registry.inc("survey_db_lock_errors_total")
+            if started is not None:
+                registry.observe("survey_db_lock_wait_seconds", time.perf_counter() - started)
+
+
+def _end_transaction(conn):
+    conn.info.pop("metrics_write_locked", None)
+
+
+def init_metrics(app) -> None:
+    """Registers the request hooks, template signals and engine events (inside an app context)."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    for engine in db.engines.values():
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+        event.listen(engine, "commit", _end_transaction)
+        event.listen(engine, "rollback", _end_transaction)
+
+    Path(app.config["METRICS_PATH"]).parent.mkdir(parents=True, exist_ok=True)
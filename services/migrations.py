@@ -0,0 +1,240 @@
+"""
+Small versioned schema migrations for the SQLite database.
+
+The applied version is kept in ``PRAGMA user_version``. Every step must also be
+safe on a fresh database where ``db.create_all()`` already built the latest
+schema, so steps check before they alter.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Integer, inspect, text
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models.response import QUESTION_FIELDS, SurveyResponse
+
+
+def _user_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def _set_user_version(conn, version: int) -> None:
+    # PRAGMA لا يقبل bind parameters
+    conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+
+def _columns(conn, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _m001_local_day(conn):
+    """survey_response.local_day (Baghdad date) + date/categorical indexes."""
+    if "local_day" not in _columns(conn, "survey_response"):
+        conn.execute(text("ALTER TABLE survey_response ADD COLUMN local_day DATE"))
+
+    conn.execute(text(
+        "UPDATE survey_response "
+        "SET local_day = date(datetime(created_at, '+3 hours')) "
+        "WHERE local_day IS NULL"
+    ))
+
+    for index in SurveyResponse.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _m002_option_codes(conn):
+    """Categorical answers: Arabic text -> survey_option codes (table rebuild)."""
+    from models.option import SurveyOption
+    from models.tally import SurveyTally
+    from services.options import seed_options
+
+    seed_options(conn)
+
+    gender_type = next(
+        c["type"] for c in inspect(conn).get_columns("survey_response") if c["name"] == "gender"
+    )
+    if isinstance(gender_type, Integer):
+        return  # قاعدة جديدة، أنشأها create_all بالشكل الحالي
+
+    # قيم موجودة في البيانات وليست في القاموس: تُحفظ كخيارات قديمة غير فعّالة
+    for q in QUESTION_FIELDS:
+        known = {
+            label for (label,) in conn.execute(
+                text("SELECT label FROM survey_option WHERE question = :q"), {"q": q}
+            )
+        }
+        next_code = conn.execute(
+            text("SELECT COALESCE(MAX(code), 0) + 1 FROM survey_option WHERE question = :q"),
+            {"q": q},
+        ).scalar()
+        for (label,) in conn.execute(text(f"SELECT DISTINCT {q} FROM survey_response")):
+            if label in known:
+                continue
+            conn.execute(
+                SurveyOption.__table__.insert(),
+                {"question": q, "code": next_code, "label": label, "is_active": False},
+            )
+            known.add(label)
+            next_code += 1
+
+    # أسماء الفهارس تبقى مع الجدول بعد RENAME، فنحذفها قبل إنشاء الجدول الجديد
+    for index in SurveyResponse.__table__.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+    conn.execute(text("ALTER TABLE survey_response RENAME TO survey_response_old"))
+    SurveyResponse.__table__.create(conn)
+
+    decoded = ", ".join(
+        f"(SELECT code FROM survey_option WHERE question = '{q}' AND label = o.{q})"
+        for q in QUESTION_FIELDS
+    )
+    conn.execute(text(
+        f"INSERT INTO survey_response (id, {', '.join(QUESTION_FIELDS)}, created_at, local_day) "
+        f"SELECT o.id, {decoded}, o.created_at, o.local_day FROM survey_response_old o"
+    ))
+    conn.execute(text("DROP TABLE survey_response_old"))
+
+    # العدّادات كانت بالنص؛ تُبنى من جديد بالأكواد في prepare_database
+    SurveyTally.__table__.drop(conn, checkfirst=True)
+    SurveyTally.__table__.create(conn)
+
+
+def _m003_keyset_index(conn):
+    """created_at index -> (created_at, id) for keyset pagination."""
+    conn.execute(text("DROP INDEX IF EXISTS ix_survey_response_created_at"))
+    for index in SurveyResponse.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _m004_autoincrement(conn):
+    """survey_response ids never reused (archived rows leave the table): AUTOINCREMENT rebuild."""
+    sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'survey_response'"
+    )).scalar()
+    if "AUTOINCREMENT" in sql.upper():
+        return  # قاعدة جديدة، أنشأها create_all بالشكل الحالي
+
+    for index in SurveyResponse.__table__.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+    conn.execute(text("ALTER TABLE survey_response RENAME TO survey_response_old"))
+    SurveyResponse.__table__.create(conn)
+
+    # نسخ الـ ids كما هي يضبط sqlite_sequence على أكبر id
+    columns = ", ".join(c.name for c in SurveyResponse.__table__.columns)
+    conn.execute(text(
+        f"INSERT INTO survey_response ({columns}) SELECT {columns} FROM survey_response_old"
+    ))
+    conn.execute(text("DROP TABLE survey_response_old"))
+
+
+def _m005_export_job_version(conn):
+    """export_job.data_version: integer max id -> text "<max id>.<restore generation>"."""
+    from models.export_job import ExportJob
+
+    columns = {c["name"]: c for c in inspect(conn).get_columns("export_job")}
+    if not isinstance(columns["data_version"]["type"], Integer):
+        return  # قاعدة جديدة، أنشأها create_all بالشكل الحالي
+
+    for index in ExportJob.__table__.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+    conn.execute(text("ALTER TABLE export_job RENAME TO export_job_old"))
+    ExportJob.__table__.create(conn)
+
+    # الملفات القديمة تبقى قابلة للتنزيل، لكن مفتاحها بدون جيل فلا يُعاد استخدامها
+    names = [c.name for c in ExportJob.__table__.columns]
+    select = ", ".join("CAST(data_version AS TEXT)" if n == "data_version" else n for n in names)
+    conn.execute(text(
+        f"INSERT INTO export_job ({', '.join(names)}) SELECT {select} FROM export_job_old"
+    ))
+    conn.execute(text("DROP TABLE export_job_old"))
+
+
+MIGRATIONS = [
+    (1, _m001_local_day),
+    (2, _m002_option_codes),
+    (3, _m003_keyset_index),
+    (4, _m004_autoincrement),
+    (5, _m005_export_job_version),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def upgrade() -> int:
+    """Applies pending migrations, returns the resulting schema version."""
+    with db.engine.begin() as conn:
+        current = _user_version(conn)
+        for version, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(conn)
+            _set_user_version(conn, version)
+            current = version
+    return current
+
+
+def prepare_database() -> None:
+    """
+    Creates missing tables, applies pending migrations, seeds the option
+    dictionary and fills survey_tally / survey_rollup the first time they
+    appear on a database that already has responses.
+    """
+    from models.export_job import ExportJob  # noqa: F401
+    from models.import_job import ImportJob  # noqa: F401
+    from models.option import SurveyOption  # noqa: F401
+    from models.partition import ResponsePartition  # noqa: F401
+    from models.rollup import SurveyRollup
+    from models.tally import SurveyTally
+    from models.user import User  # noqa: F401
+    from services.options import seed_options
+    from services.tallies import rebuild_tallies
+
+    db.create_all()
+    upgrade()
+    seed_options()
+
+    missing = SurveyTally.query.first() is None or SurveyRollup.query.first() is None
+    if missing and SurveyResponse.query.first() is not None:
+        rebuild_tallies()
+
+
+def seed_admin() -> None:
+    """Creates the default admin account if it does not exist yet."""
+    from models.user import User
+
+    # Admin default
+    admin_email = "ali@admin.com"
+    admin = User.query.filter_by(email=admin_email).first()
+    if not admin:
+        admin = User(
+            name="Survey Admin",
+            email=admin_email,
+            password=generate_password_hash("Ali@123"),
+            role="admin",
+        )
+        db.session.add(admin)
+        db.session.commit()
+        print("✅ DB ready + ADMIN created (ali@admin.com / Admin@123)")
+    else:
+        print("✅ DB ready + ADMIN already exists")
+
+
+def init_database(app) -> None:
+    """
+    One-time setup per deployment (not per worker): schema, migrations,
+    option dictionary, aggregates and the default admin. Idempotent.
+    """
+    with app.app_context():
+        prepare_database()
+        seed_admin()
+        # لا نترك اتصالات مفتوحة تُورَّث للعمّال بعد fork
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create/upgrade the schema and seed the option dictionary and admin."""
+    from flask import current_app
+    init_database(current_app._get_current_object())
@@ -0,0 +1,89 @@
+"""
+Option dictionary: label <-> code mapping for the categorical answers.
+
+Responses store small integer codes; labels are only looked up at the edges
+(form validation on the way in, templates/exports/PDF on the way out). The
+mapping is loaded once per process and dropped after a restore.
+"""
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models.option import SURVEY_OPTIONS, SurveyOption
+from models.response import QUESTION_FIELDS
+from services.backups import on_restore
+
+_maps = None
+
+
+def seed_options(conn=None) -> None:
+    """Inserts any missing canonical options (idempotent)."""
+    rows = [
+        {"question": q, "code": code, "label": label, "is_active": True}
+        for q, labels in SURVEY_OPTIONS.items()
+        for code, label in enumerate(labels, start=1)
+    ]
+    stmt = sqlite_insert(SurveyOption).values(rows).on_conflict_do_nothing()
+    if conn is None:
+        db.session.execute(stmt)
+        db.session.commit()
+    else:
+        conn.execute(stmt)
+
+
+def _load():
+    global _maps
+    if _maps is None:
+        labels = {q: {} for q in QUESTION_FIELDS}
+        codes = {q: {} for q in QUESTION_FIELDS}
+        active = {q: [] for q in QUESTION_FIELDS}
+        for opt in SurveyOption.query.order_by(SurveyOption.question, SurveyOption.code):
+            if opt.question not in labels:
+                continue
+            labels[opt.question][opt.code] = opt.label
+            if opt.is_active:
+                codes[opt.question][opt.label] = opt.code
+                active[opt.question].append(opt.label)
+        _maps = labels, codes, active
+    return _maps
+
+
+@on_restore
+def reset_cache() -> None:
+    global _maps
+    _maps = None
+
+
+def option_labels():
+    """{question: {code: label}} including inactive (legacy) options."""
+    return _load()[0]
+
+
+def active_options():
+    """{question: [label, ...]} in display order — what the survey form offers."""
+    return _load()[2]
+
+
+def option_label(question: str, code):
+    return option_labels()[question].get(code, "")
+
+
+def decode_counts(question: str, counts: dict) -> dict:
+    """{code: n} -> {label: n}"""
+    labels = option_labels()[question]
+    return {labels.get(code, str(code)): n for code, n in counts.items()}
+
+
+def encode_answers(form):
+    """
+    Validates submitted labels against the active options.
+    Returns (values, errors): values = {question: code}, errors = [question, ...].
+    """
+    codes = _load()[1]
+    values, errors = {}, []
+    for q in QUESTION_FIELDS:
+        code = codes[q].get((form.get(q) or "").strip())
+        if code is None:
+            errors.append(q)
+        else:
+            values[q] = code
+    return values, errors
@@ -0,0 +1,97 @@
+"""
+Pre-rendered public pages (survey form, thank-you page, about).
+
+Their HTML is identical for every visitor, so each page is rendered once
+per process and kept in memory as identity, gzip and (if the optional
+Brotli package is installed) br bodies, each with its own strong ETag.
+Repeat visitors revalidate to a 304; everyone else gets the smallest body
+their Accept-Encoding allows. The cache is dropped after a restore (the
+option dictionary may have changed) and, when Jinja auto-reload is on
+(debug), whenever a template file changes.
+"""
+import gzip
+import hashlib
+import threading
+from pathlib import Path
+
+from flask import Response, current_app, render_template, request
+
+from services.backups import on_restore
+
+try:
+    import brotli
+except ImportError:  # Brotli اختياري؛ بدونه نكتفي بـ gzip
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+_pages = {}  # name -> (templates version, {encoding: (body, etag)})
+_lock = threading.Lock()
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def _render_variants(template, context):
+    html = render_template(template, **context).encode("utf-8")
+    digest = hashlib.sha256(html).hexdigest()[:20]
+    variants = {"identity": (html, digest)}
+    for encoding in ENCODINGS:
+        body = _compress(html, encoding)
+        if len(body) < len(html):
+            variants[encoding] = (body, f"{digest}-{encoding}")
+    return variants
+
+
+def _templates_version():
+    # في الإنتاج القوالب لا تتغير بدون إعادة تشغيل؛ مع auto_reload نفحص التعديل
+    app = current_app
+    if not app.jinja_env.auto_reload:
+        return 0
+    folder = Path(app.root_path) / app.template_folder
+    return max((p.stat().st_mtime_ns for p in folder.rglob("*.html")), default=0)
+
+
+@on_restore
+def clear_pages() -> None:
+    with _lock:
+        _pages.clear()
+
+
+def cached_page(name: str, template: str, **context) -> Response:
+    """
+    Serves `template` (rendered with `context`, which must not depend on the
+    request) from the page cache, negotiated by Accept-Encoding and
+    conditional on If-None-Match.
+    """
+    version = _templates_version()
+    hit = _pages.get(name)
+    if hit is None or hit[0] != version:
+        variants = _render_variants(template, context)
+        with _lock:
+            _pages[name] = hit = (version, variants)
+    variants = hit[1]
+
+    encoding = request.accept_encodings.best_match(
+        [e for e in ENCODINGS if e in variants]
+    ) or "identity"
+    body, etag = variants[encoding]
+
+    response = Response(body, mimetype="text/html")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if request.method not in ("GET", "HEAD"):
+        # صفحة الشكر بعد POST: جسم مضغوط فقط، بدون تخزين
+        response.cache_control.no_store = True
+        return response
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config["PAGE_CACHE_MAX_AGE"]
+    return response.make_conditional(request)
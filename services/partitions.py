@@ -0,0 +1,383 @@
+"""
+Monthly partitions of survey_response.
+
+Closed months can be moved out of app.db into one SQLite file each under
+database/archive/ (``flask archive-responses``). An archive is written once
+and never changed again: rows in (created_at, id) order, the same indexes,
+VACUUMed, read-only, optionally gzip-compressed, and it carries the
+survey_tally / survey_rollup rows of its month so tallies can be rebuilt
+without rescanning it. response_partition in app.db is the catalog; a
+partition becomes visible and its rows leave app.db in one transaction.
+
+Readers go through response_segments(): a Baghdad-day range is split into
+segments that each touch at most one archive, and only the archives the
+range needs are ATTACHed (read-only) on the current connection. Responses
+that arrive for a month after it was archived (late imports) simply stay
+in app.db, so every segment also reads survey_response itself.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+from collections import Counter, OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import quote
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import MetaData, func, union_all
+
+from extensions import db
+from models.partition import ResponsePartition
+from models.response import SurveyResponse
+from models.rollup import SurveyRollup
+from models.tally import SurveyTally
+from services.tallies import aggregate_selects
+from utils import baghdad_day
+
+# SQLite يسمح بـ 10 قواعد مرفقة لكل اتصال؛ نترك هامشًا لـ archive_new
+MAX_ATTACHED = 8
+
+# (table, key columns) of the aggregates stored inside every archive
+AGGREGATES = (
+    (SurveyTally, ("question", "option", "day")),
+    (SurveyRollup, ("grain", "question", "bucket", "option")),
+)
+
+Segment = namedtuple("Segment", "day_from day_to tables")
+
+_tables = {}  # (schema, table name) -> Table
+
+
+def archive_dir() -> Path:
+    d = Path(current_app.config["ARCHIVE_DIR"])
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def period_of(day) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def period_days(period: str):
+    """'YYYY-MM' -> (first day, last day); ValueError if malformed."""
+    first = datetime.strptime(period, "%Y-%m").date()
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first, following - timedelta(days=1)
+
+
+def partition_table(schema: str, table=SurveyResponse.__table__):
+    """`table` as it appears in the attached database `schema`."""
+    key = (schema, table.name)
+    if key not in _tables:
+        _tables[key] = table.to_metadata(MetaData(), schema=schema)
+    return _tables[key]
+
+
+# ---------------------------------------------------------------------------
+# Attaching archives
+# ---------------------------------------------------------------------------
+
+def _readable_path(partition) -> Path:
+    path = archive_dir() / partition.file_name
+    if not partition.compressed:
+        return path
+    # النسخة المضغوطة تُفك مرة واحدة إلى .cache (الملف لا يتغير بعد الأرشفة)
+    unpacked = archive_dir() / ".cache" / path.stem
+    if not unpacked.exists():
+        unpacked.parent.mkdir(exist_ok=True)
+        tmp = unpacked.with_name(f"{unpacked.name}.{os.getpid()}.part")
+        with gzip.open(path, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, unpacked)
+    return unpacked
+
+
+def _detach(conn, attached, alias):
+    conn.exec_driver_sql(f"DETACH DATABASE {alias}")
+    del attached[alias]
+
+
+def attach(partition, session=None) -> str:
+    """
+    ATTACHes the partition's file read-only on the connection of `session`
+    (default db.session; once per pooled connection) and returns its schema
+    name. Call it outside write transactions: SQLite cannot DETACH (to stay
+    under the attach limit) a file the open transaction has read from.
+    """
+    conn = (session or db.session).connection()
+    attached = conn.info.setdefault("response_partitions", OrderedDict())
+    alias = "p_" + partition.period.replace("-", "_")
+
+    if attached.get(alias) == partition.file_name:
+        attached.move_to_end(alias)
+        return alias
+    # ملف آخر لنفس الشهر (بعد استعادة نسخة)، أو لا مكان: نفصل الأقدم استخدامًا
+    if alias in attached:
+        _detach(conn, attached, alias)
+    while len(attached) >= MAX_ATTACHED:
+        _detach(conn, attached, next(iter(attached)))
+
+    uri = f"file:{quote(_readable_path(partition).as_posix())}?mode=ro"
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {alias}", (uri,))
+    attached[alias] = partition.file_name
+    return alias
+
+
+# ---------------------------------------------------------------------------
+# Reading across partitions
+# ---------------------------------------------------------------------------
+
+def archived_partitions(day_from=None, day_to=None, session=None):
+    """Archived months overlapping [day_from, day_to] (None = open), oldest first."""
+    stmt = db.select(ResponsePartition).order_by(ResponsePartition.period)
+    if day_from is not None:
+        stmt = stmt.where(ResponsePartition.day_to >= day_from)
+    if day_to is not None:
+        stmt = stmt.where(ResponsePartition.day_from <= day_to)
+    return (session or db.session).execute(stmt).scalars().all()
+
+
+def response_segments(day_from=None, day_to=None, newest_first=False, session=None):
+    """
+    Splits the Baghdad-day range [day_from, day_to] (None = open) into
+    Segment(day_from, day_to, tables), in date order (newest first if asked).
+    `tables` is [survey_response] or [archived month, survey_response]; the
+    archive is attached (on `session`'s connection) only when its segment
+    is reached.
+    """
+    main = SurveyResponse.__table__
+    pieces, cursor = [], day_from
+    for p in archived_partitions(day_from, day_to, session):
+        if cursor is None or cursor < p.day_from:
+            pieces.append((cursor, p.day_from - timedelta(days=1), None))
+        start = p.day_from if cursor is None else max(cursor, p.day_from)
+        end = p.day_to if day_to is None else min(day_to, p.day_to)
+        pieces.append((start, end, p))
+        cursor = p.day_to + timedelta(days=1)
+    if day_to is None or cursor is None or cursor <= day_to:
+        pieces.append((cursor, day_to, None))
+
+    if newest_first:
+        pieces.reverse()
+    for start, end, partition in pieces:
+        tables = [main] if partition is None else [partition_table(attach(partition, session)), main]
+        yield Segment(start, end, tables)
+
+
+def day_filter(table, day_from, day_to):
+    """WHERE terms limiting `table` to Baghdad days [day_from, day_to]."""
+    terms = []
+    if day_from is not None:
+        terms.append(table.c.local_day >= day_from)
+    if day_to is not None:
+        terms.append(table.c.local_day <= day_to)
+    return terms
+
+
+def _ordered(stmt, columns, keys, descending):
+    return stmt.order_by(*(columns[k].desc() if descending else columns[k].asc() for k in keys))
+
+
+def segment_select(segment, build, order_by=(), descending=False, limit=None):
+    """
+    One statement over all tables of `segment`. build(table) returns the
+    SELECT for one table; each one is ordered/limited on its own index and
+    the results are merged by the same `order_by` column keys.
+    """
+    parts = []
+    for table in segment.tables:
+        stmt = build(table)
+        stmt = _ordered(stmt, stmt.selected_columns, order_by, descending)
+        parts.append(stmt if limit is None else stmt.limit(limit))
+    if len(parts) == 1:
+        return parts[0]
+
+    union = union_all(*(db.select(part.subquery()) for part in parts)).subquery()
+    stmt = _ordered(db.select(union), union.c, order_by, descending)
+    return stmt if limit is None else stmt.limit(limit)
+
+
+def archived_tables(session=None):
+    """(partition, its survey_response Table) for every archived month, attached in turn."""
+    for p in archived_partitions(session=session):
+        yield p, partition_table(attach(p, session))
+
+
+def archived_aggregates():
+    """(model, key columns, Counter) with the tallies/rollups stored in each archive."""
+    for p in archived_partitions():
+        schema = attach(p)
+        for model, keys in AGGREGATES:
+            table = partition_table(schema, model.__table__)
+            rows = db.session.execute(db.select(*(table.c[k] for k in keys), table.c.count))
+            yield model, keys, Counter({tuple(r[:-1]): r[-1] for r in rows})
+
+
+# ---------------------------------------------------------------------------
+# Archiving
+# ---------------------------------------------------------------------------
+
+def _seal(path: Path) -> None:
+    """Rollback journal (single file), fresh statistics, no free pages."""
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise RuntimeError(f"{path.name}: integrity check failed: {result}")
+
+
+def _copy_month(conn, selected) -> None:
+    """Rows matching `selected` and their aggregates into the attached archive_new."""
+    main = SurveyResponse.__table__
+    target = partition_table("archive_new")
+    for table in (main, SurveyTally.__table__, SurveyRollup.__table__):
+        partition_table("archive_new", table).create(conn)
+    # فهارس الأسئلة تخدم العدّادات فقط، وهي محسوبة مسبقًا داخل الملف
+    for index in target.indexes:
+        if index.name.startswith("ix_survey_response_local_day_"):
+            index.drop(conn)
+
+    conn.execute(target.insert().from_select(
+        [c.name for c in main.columns],
+        db.select(main).where(*selected).order_by(main.c.created_at, main.c.id),
+    ))
+    for table, columns, select in aggregate_selects(target):
+        conn.execute(partition_table("archive_new", table).insert().from_select(columns, select))
+
+
+def archive_month(period: str, compress=False):
+    """
+    Moves the responses of a closed Baghdad month into its own archive file.
+    Returns the new ResponsePartition, or None if app.db has no rows for it.
+    """
+    day_from, day_to = period_days(period)
+    if period >= period_of(baghdad_day(datetime.utcnow())):
+        raise ValueError(f"{period} is not a closed month yet")
+    if db.session.get(ResponsePartition, period) is not None:
+        raise ValueError(f"{period} is already archived")
+
+    main = SurveyResponse.__table__
+    # الصفوف حتى هذا الـ id فقط: ما يصل أثناء النسخ يبقى في app.db
+    max_id = db.session.execute(
+        db.select(func.max(main.c.id)).where(*day_filter(main, day_from, day_to))
+    ).scalar()
+    db.session.rollback()
+    if max_id is None:
+        return None
+    selected = [*day_filter(main, day_from, day_to), main.c.id <= max_id]
+
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    path = archive_dir() / f"responses-{period}.{stamp}.db"
+    tmp = path.with_name(path.name + ".part")
+    tmp.unlink(missing_ok=True)
+
+    try:
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("ATTACH DATABASE ? AS archive_new", (str(tmp),))
+            conn.commit()
+            try:
+                with conn.begin():
+                    _copy_month(conn, selected)
+                    target = partition_table("archive_new")
+                    rows, min_id = conn.execute(
+                        db.select(func.count(), func.min(target.c.id))
+                    ).one()
+            finally:
+                conn.exec_driver_sql("DETACH DATABASE archive_new")
+
+        _seal(tmp)
+        if compress:
+            path = path.with_name(path.name + ".gz")
+            with open(tmp, "rb") as src, gzip.open(path, "wb", compresslevel=9) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            tmp.unlink()
+        else:
+            os.replace(tmp, path)
+        os.chmod(path, 0o444)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+        raise
+
+    # الشهر يظهر في الفهرس وصفوفه تُحذف من app.db في transaction واحدة
+    try:
+        partition = ResponsePartition(
+            period=period,
+            file_name=path.name,
+            compressed=compress,
+            day_from=day_from,
+            day_to=day_to,
+            row_count=rows,
+            min_id=min_id,
+            max_id=max_id,
+        )
+        db.session.add(partition)
+        deleted = db.session.execute(main.delete().where(*selected)).rowcount
+        if deleted != rows:
+            raise RuntimeError(f"{period}: copied {rows} rows but {deleted} matched for delete")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        path.unlink(missing_ok=True)
+        raise
+    return partition
+
+
+def months_due(after_months: int):
+    """Months with responses still in app.db that are at least `after_months` old."""
+    today = baghdad_day(datetime.utcnow())
+    first = today.replace(day=1)
+    for _ in range(after_months):
+        first = (first - timedelta(days=1)).replace(day=1)
+
+    main = SurveyResponse.__table__
+    month = func.strftime("%Y-%m", main.c.local_day)
+    return db.session.execute(
+        db.select(month, func.count()).where(main.c.local_day < first).group_by(month).order_by(month)
+    ).all()
+
+
+@click.command("archive-responses")
+@click.option("--month", "months", multiple=True, metavar="YYYY-MM",
+              help="Month to archive (repeatable). Default: months older than ARCHIVE_AFTER_MONTHS.")
+@click.option("--compress", is_flag=True, help="Store the archive files gzip-compressed.")
+@with_appcontext
+def archive_responses_command(months, compress):
+    """Move closed months of survey responses into read-only archive files."""
+    if months:
+        for period in months:
+            try:
+                period_days(period)
+            except ValueError:
+                raise click.BadParameter(f"{period!r} is not YYYY-MM", param_hint="--month")
+        due = [(period, None) for period in sorted(set(months))]
+    else:
+        due = months_due(current_app.config["ARCHIVE_AFTER_MONTHS"])
+
+    for period, count in due:
+        if db.session.get(ResponsePartition, period) is not None:
+            # ردود متأخرة لشهر مؤرشف تبقى في app.db (القراءات تشملها)
+            later = f", {count} later responses stay in app.db" if count else ""
+            click.echo(f"{period}: already archived{later}")
+            continue
+        try:
+            partition = archive_month(period, compress=compress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if partition is None:
+            click.echo(f"{period}: no responses")
+            continue
+        size = (archive_dir() / partition.file_name).stat().st_size
+        click.echo(
+            f"✅ {period}: {partition.row_count} responses -> "
+            f"{partition.file_name} ({size / 1024:.0f} KB)"
+        )
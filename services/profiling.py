@@ -0,0 +1,170 @@
+"""
+Opt-in request profiling.
+
+An admin can profile a single request with the header ``X-Profile: 1`` or
+the query flag ``?profile=1`` (cProfile, written as .prof for pstats /
+snakeviz) or ``sample`` (stack sampling every PROFILE_SAMPLE_INTERVAL
+seconds, written as collapsed stacks for flamegraph.pl / speedscope).
+PROFILE_SAMPLE_RATE additionally profiles that fraction of the requests to
+PROFILE_SAMPLE_ENDPOINTS.
+
+Streamed responses are profiled until they are closed, so CSV/NDJSON
+exports are covered until their last chunk. Files go to profiles/ (newest
+PROFILE_KEEP kept).
+"""
+import cProfile
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+def profiles_dir(app=None) -> Path:
+    d = Path((app or current_app).root_path) / "profiles"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+class _CProfiler:
+    mode, suffix = "cprofile", ".prof"
+
+    def __init__(self, interval):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self, path):
+        self.profile.disable()
+        self.profile.dump_stats(str(path))
+
+
+class _StackSampler:
+    """Samples the request thread's stack from a helper thread."""
+    mode, suffix = "sample", ".collapsed"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.target = threading.get_ident()
+        self.stacks = Counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self, path):
+        self._done.set()
+        self._thread.join()
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, n in self.stacks.most_common():
+                fh.write(f"{stack} {n}\n")
+
+
+_PROFILERS = {"cprofile": _CProfiler, "sample": _StackSampler}
+
+
+def _requested_mode():
+    flag = (request.headers.get("X-Profile") or request.args.get("profile") or "").strip().lower()
+    if flag:
+        # فقط الأدمن يستطيع طلب profile لطلب معيّن
+        if not (current_user.is_authenticated and current_user.role == "admin"):
+            return None
+        return "sample" if flag == "sample" else "cprofile"
+
+    cfg = current_app.config
+    if (
+        cfg["PROFILE_SAMPLE_RATE"] > 0
+        and request.endpoint in cfg["PROFILE_SAMPLE_ENDPOINTS"]
+        and random.random() < cfg["PROFILE_SAMPLE_RATE"]
+    ):
+        return cfg["PROFILE_SAMPLE_MODE"]
+    return None
+
+
+def _start_profiling():
+    mode = _requested_mode()
+    if mode is None:
+        return
+    try:
+        g.profiler = _PROFILERS[mode](current_app.config["PROFILE_SAMPLE_INTERVAL"])
+    except (ValueError, RuntimeError):
+        # profiler آخر فعّال في نفس العملية (مثلاً طلبان بنفس الوقت مع cProfile)
+        current_app.logger.warning("profiling skipped: another profiler is active")
+        return
+    g.profile_started = time.perf_counter()
+
+
+def _finish_profiling(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+
+    app = current_app._get_current_object()
+    started = g.pop("profile_started")
+    endpoint = request.endpoint or "unmatched"
+
+    def finish():
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        name = f"{stamp}--{endpoint}--{elapsed_ms:.0f}ms--{uuid.uuid4().hex[:6]}{profiler.suffix}"
+        try:
+            profiler.stop(profiles_dir(app) / name)
+            prune_profiles(app)
+        except Exception:
+            app.logger.exception("could not write profile %s", name)
+
+    response.headers["X-Profile-Mode"] = profiler.mode
+    if response.is_streamed and not response.direct_passthrough:
+        # CSV/NDJSON تُولَّد أثناء الإرسال
+        response.call_on_close(finish)
+    else:
+        # الملف جاهز بالكامل (send_file لا يستدعي call_on_close)
+        finish()
+    return response
+
+
+def recent_profiles(limit=20, app=None):
+    """Newest profile files first: [{name, endpoint, ms, size, created}]"""
+    files = sorted(
+        (p for p in profiles_dir(app).iterdir() if p.suffix in (".prof", ".collapsed")),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    out = []
+    for p in files[:limit]:
+        parts = p.stem.split("--")
+        out.append({
+            "name": p.name,
+            "endpoint": parts[1] if len(parts) == 4 else "",
+            "ms": parts[2] if len(parts) == 4 else "",
+            "format": "pstats" if p.suffix == ".prof" else "collapsed",
+            "size": p.stat().st_size,
+            "created": datetime.fromtimestamp(p.stat().st_mtime),
+        })
+    return out
+
+
+def prune_profiles(app=None) -> None:
+    keep = (app or current_app).config["PROFILE_KEEP"]
+    files = sorted(profiles_dir(app).iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in files[keep:]:
+        p.unlink(missing_ok=True)
+
+
+def init_profiling(app) -> None:
+    app.before_request(_start_profiling)
+    app.after_request(_finish_profiling)
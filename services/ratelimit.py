@@ -0,0 +1,161 @@
+"""
+Request guards shared by all gunicorn workers of one host.
+
+- hit(): fixed-window attempt counters (login).
+- take(): token buckets (survey submissions per IP).
+- claim(): one-time keys (form tokens against double submits).
+
+State lives in the shared cache file (SHARED_CACHE_PATH, one table each),
+so a limit holds whichever worker gets the request, and checking one costs a
+single small write transaction in that file — cheap next to the PBKDF2 hash
+or app.db write it guards. A broken cache file fails open.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+_local = threading.local()
+
+
+def _conn() -> sqlite3.Connection:
+    path = current_app.config["SHARED_CACHE_PATH"]
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != path or _local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit ("
+            " key TEXT PRIMARY KEY, reset_at REAL NOT NULL, count INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_bucket ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS once_key (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        _local.conn, _local.path, _local.pid = conn, path, os.getpid()
+    return conn
+
+
+@contextmanager
+def _immediate():
+    """Write transaction on the shared file (BEGIN IMMEDIATE: no upgrade deadlocks)."""
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def hit(key: str, limit: int, window: float) -> float:
+    """
+    Counts one attempt for `key`. Returns 0 while the key is within `limit`
+    attempts per `window` seconds, otherwise the seconds until it resets.
+    """
+    now = time.time()
+    try:
+        with _immediate() as conn:
+            conn.execute(
+                "INSERT INTO rate_limit (key, reset_at, count) VALUES (:key, :reset_at, 1) "
+                "ON CONFLICT(key) DO UPDATE SET"
+                " count = CASE WHEN reset_at <= :now THEN 1 ELSE count + 1 END,"
+                " reset_at = CASE WHEN reset_at <= :now THEN excluded.reset_at ELSE reset_at END",
+                {"key": key, "reset_at": now + window, "now": now},
+            )
+            count, reset_at = conn.execute(
+                "SELECT count, reset_at FROM rate_limit WHERE key = ?", (key,)
+            ).fetchone()
+            if random.random() < 0.01:
+                # تنظيف النوافذ المنتهية من وقت لآخر
+                conn.execute("DELETE FROM rate_limit WHERE reset_at <= ?", (now,))
+    except sqlite3.Error:
+        # عطل في ملف الكاش لا يجب أن يمنع الدخول
+        current_app.logger.exception("rate limit check failed for %s", key)
+        return 0.0
+    return 0.0 if count <= limit else max(reset_at - now, 0.001)
+
+
+def peek(key: str, limit: int) -> float:
+    """Like hit() without counting: seconds until `key` is below `limit` again (0 = it is)."""
+    now = time.time()
+    try:
+        row = _conn().execute("SELECT count, reset_at FROM rate_limit WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        current_app.logger.exception("rate limit check failed for %s", key)
+        return 0.0
+    if row is None or row[1] <= now or row[0] < limit:
+        return 0.0
+    return max(row[1] - now, 0.001)
+
+
+def take(key: str, rate: float, burst: int) -> float:
+    """
+    Token bucket for `key`: up to `burst` requests at once, refilled at
+    `rate` tokens per second. Returns 0 and spends a token when one is
+    available, otherwise the seconds until the next one (nothing is spent).
+    """
+    now = time.time()
+    try:
+        with _immediate() as conn:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_bucket WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO token_bucket (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens - 1, now),
+            )
+            if random.random() < 0.01:
+                # سطل امتلأ من جديد = نفس غيابه
+                conn.execute("DELETE FROM token_bucket WHERE updated_at <= ?", (now - burst / rate,))
+    except sqlite3.Error:
+        current_app.logger.exception("token bucket check failed for %s", key)
+    return 0.0
+
+
+def claim(key: str, ttl: float) -> bool:
+    """
+    Marks `key` as used for `ttl` seconds. True the first time, False for
+    every repeat within the ttl (any worker).
+    """
+    now = time.time()
+    try:
+        with _immediate() as conn:
+            conn.execute("DELETE FROM once_key WHERE key = ? AND expires_at <= ?", (key, now))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO once_key (key, expires_at) VALUES (?, ?)", (key, now + ttl)
+            ).rowcount
+            if random.random() < 0.01:
+                conn.execute("DELETE FROM once_key WHERE expires_at <= ?", (now,))
+    except sqlite3.Error:
+        current_app.logger.exception("claim failed for %s", key)
+        return True
+    return inserted == 1
+
+
+def reset(key: str) -> None:
+    try:
+        _conn().execute("DELETE FROM rate_limit WHERE key = ?", (key,))
+    except sqlite3.Error:
+        current_app.logger.exception("rate limit reset failed for %s", key)
+
+
+def release(key: str) -> None:
+    """Frees a claimed key again (the guarded work failed)."""
+    try:
+        _conn().execute("DELETE FROM once_key WHERE key = ?", (key,))
+    except sqlite3.Error:
+        current_app.logger.exception("release failed for %s", key)
@@ -0,0 +1,137 @@
+"""
+PDF statistics report (Arabic, Tajawal font) for a Baghdad-day range.
+
+reportlab, arabic_reshaper and bidi are imported on first use so workers
+that never build a PDF do not load them.
+"""
+from functools import lru_cache
+from pathlib import Path
+
+from flask import current_app
+
+from services.tallies import question_counts
+
+PDF_MIMETYPE = "application/pdf"
+
+
+@lru_cache(maxsize=4096)
+def _ar(text: str) -> str:
+    # التشكيل + bidi مكلف، والتسميات نفسها تتكرر في كل تقرير
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+
+    if text is None:
+        text = ""
+    return get_display(arabic_reshaper.reshape(str(text)))
+
+
+@lru_cache(maxsize=None)
+def _base_font(font_path: str) -> str:
+    """Registers Tajawal once per process; falls back to Helvetica if missing."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if Path(font_path).exists():
+        pdfmetrics.registerFont(TTFont("Tajawal", font_path))
+        return "Tajawal"
+    return "Helvetica"
+
+
+def write_pdf(fileobj, day_from, day_to):
+    """Draws the statistics report for [day_from, day_to] into `fileobj`."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.pdfgen import canvas
+
+    date_from = day_from.isoformat()
+    date_to = day_to.isoformat()
+
+    # كل الإحصائيات + المجموع بقراءة واحدة من جدول العدّادات (تاريخ بغداد)،
+    # فالوقت يعتمد على عدد الخيارات × الأيام وليس على عدد المشاركات
+    counts = question_counts(day_from, day_to)
+
+    gender = counts["gender"]
+    stage = counts["education_stage"]
+    satisfaction = counts["satisfaction"]
+    understanding = counts["understanding_help"]
+    device = counts["device"]
+    internet = counts["internet_quality"]
+    platform = counts["platform_ease"]
+    interaction = counts["teacher_interaction"]
+    preference = counts["study_preference"]
+    cont = counts["continue_elearning"]
+
+    total = sum(gender.values())
+
+    # ✅ Tajawal font (embedded in PDF, registered once per process)
+    font_path = Path(current_app.root_path) / "static" / "fonts" / "Tajawal-Regular.ttf"
+    base_font = _base_font(str(font_path))
+
+    c = canvas.Canvas(fileobj, pagesize=A4)
+    w, h = A4
+
+    def draw_title(txt, y):
+        c.setFont(base_font, 18)
+        c.setFillColor(colors.HexColor("#0F172A"))
+        c.drawRightString(w - 2*cm, y, _ar(txt))
+
+    def draw_sub(txt, y):
+        c.setFont(base_font, 12)
+        c.setFillColor(colors.HexColor("#475569"))
+        c.drawRightString(w - 2*cm, y, _ar(txt))
+
+    def draw_section(txt, y):
+        c.setFont(base_font, 14)
+        c.setFillColor(colors.HexColor("#0F172A"))
+        c.drawRightString(w - 2*cm, y, _ar(txt))
+        c.setStrokeColor(colors.HexColor("#CBD5E1"))
+        c.line(2*cm, y-6, w-2*cm, y-6)
+
+    def draw_kv(dic, y, max_rows=10):
+        c.setFont(base_font, 12)
+        c.setFillColor(colors.HexColor("#0F172A"))
+        items_sorted = sorted(dic.items(), key=lambda x: x[1], reverse=True)
+        if not items_sorted:
+            c.drawRightString(w - 2*cm, y, _ar("لا توجد بيانات"))
+            return y - 18
+
+        for i, (k, v) in enumerate(items_sorted[:max_rows]):
+            c.drawRightString(w - 2*cm, y - i*16, _ar(f"{k} : {v}"))
+        return y - min(len(items_sorted), max_rows)*16 - 8
+
+    # Header
+    draw_title("تقرير إحصائيات الاستبيان", h - 2.2*cm)
+    draw_sub(f"الفترة: {date_from}  إلى  {date_to}", h - 3.1*cm)
+    draw_sub(f"عدد المشاركات: {total}", h - 3.8*cm)
+
+    y = h - 5.0*cm
+
+    # Sections (multiple pages)
+    blocks = [
+        ("الجنس", gender),
+        ("المرحلة الدراسية", stage),
+        ("الرضا عن التعلم الإلكتروني", satisfaction),
+        ("هل يساعد على فهم المادة؟", understanding),
+        ("الجهاز المستخدم", device),
+        ("جودة الإنترنت", internet),
+        ("سهولة المنصة", platform),
+        ("التفاعل مع المدرس", interaction),
+        ("تفضيل طريقة الدراسة", preference),
+        ("الاستمرار بالتعلم الإلكتروني", cont),
+    ]
+
+    for label, data in blocks:
+        if y < 5.2*cm:
+            c.showPage()
+            y = h - 3*cm
+
+        draw_section(label, y)
+        y = draw_kv(data, y - 22)
+
+    # Footer
+    c.setFont(base_font, 10)
+    c.setFillColor(colors.HexColor("#64748B"))
+    c.drawString(2*cm, 1.6*cm, _ar("تم إنشاء هذا التقرير تلقائيًا من نظام الاستبيان."))
+
+    c.save()
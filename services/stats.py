@@ -0,0 +1,77 @@
+"""
+Dashboard aggregates, computed from survey_tally and cached across workers.
+"""
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from extensions import db
+from services.backups import restore_generation
+from services.cache import cached
+from services.tallies import question_counts
+from services.trends import response_trend
+from utils import baghdad_day
+
+
+def max_response_id() -> int:
+    """
+    Highest id ever given to a response (AUTOINCREMENT counter): grows with
+    every insert and, unlike MAX(id), does not drop when old months are
+    archived out of survey_response.
+    """
+    seq = db.session.execute(
+        text("SELECT seq FROM sqlite_sequence WHERE name = 'survey_response'")
+    ).scalar()
+    return seq or 0
+
+
+def data_version() -> str:
+    """Changes on every new response and on every restore."""
+    return f"{max_response_id()}.{restore_generation()}"
+
+
+def _top3(d):
+    return sorted(d.items(), key=lambda x: x[1], reverse=True)[:3]
+
+
+def compute_dashboard_stats(watermark=None, today=None) -> dict:
+    counts = question_counts()
+
+    # Last 7 days trend (Baghdad date), oldest -> newest, days without responses = 0
+    today = today or baghdad_day(datetime.utcnow())
+    trend = response_trend("day", today - timedelta(days=6), today)
+
+    return {
+        # آخر id وجيل الاستعادة المحسوبان ضمن هذه الأرقام (نقطة البداية لتحديثات /api/stream)
+        "watermark": watermark,
+        # كل مشاركة لها جنس واحد، فمجموعها = إجمالي المشاركات
+        "total": sum(counts["gender"].values()),
+        "counts": counts,
+        "trend": {"labels": trend["labels"], "values": trend["total"]},
+        "kpis": {
+            "top_device": _top3(counts["device"]),
+            "top_stage": _top3(counts["education_stage"]),
+            "top_preference": _top3(counts["study_preference"]),
+            "top_satisfaction": _top3(counts["satisfaction"]),
+        },
+    }
+
+
+def dashboard_stats():
+    """
+    Returns (json_text, version, updated_at) for the dashboard aggregates.
+    Computed once per data version for all workers (shared cache).
+    """
+    watermark = data_version()
+    # اليوم جزء من النسخة: نافذة الأيام السبعة تتحرك حتى بدون مشاركات جديدة
+    today = baghdad_day(datetime.utcnow())
+    version = f"{watermark}.{today.isoformat()}"
+    text, updated_at = cached(
+        "dashboard_stats",
+        version,
+        lambda: json.dumps(
+            compute_dashboard_stats(watermark, today), ensure_ascii=False, sort_keys=True
+        ),
+    )
+    return text, version, updated_at
@@ -0,0 +1,145 @@
+from collections import Counter
+from datetime import datetime, time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models.response import QUESTION_FIELDS, SurveyResponse
+from models.rollup import SurveyRollup
+from models.tally import SurveyTally
+from services.options import decode_counts
+from utils import baghdad_day, baghdad_hour, week_start
+
+# bucket start as SQLAlchemy stores DateTime on SQLite, computed in SQL for rebuilds
+def _hour_bucket(table):
+    return func.strftime("%Y-%m-%d %H:00:00.000000", table.c.created_at, "+3 hours")
+
+
+def _week_bucket(table):
+    return func.strftime("%Y-%m-%d 00:00:00.000000", table.c.local_day, "weekday 0", "-6 days")
+
+
+# صفوف لكل INSERT (حد SQLite لعدد المتغيرات في الجملة الواحدة)
+UPSERT_CHUNK = 2000
+
+
+def _upsert_counts(model, keys, counter):
+    rows = [{**dict(zip(keys, key)), "count": n} for key, n in counter.items()]
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        stmt = sqlite_insert(model).values(rows[start:start + UPSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={"count": model.count + stmt.excluded["count"]},
+        )
+        db.session.execute(stmt)
+
+
+def bump_tallies(responses):
+    """
+    Adds the given (not yet committed) responses to the daily tally table and
+    the hourly/weekly rollups. Runs on the caller's session so it
+    commits/rolls back with the inserts.
+    """
+    daily, rollup = Counter(), Counter()
+    for r in responses:
+        day = baghdad_day(r.created_at)
+        hour = baghdad_hour(r.created_at)
+        week = datetime.combine(week_start(day), time.min)
+        for q in QUESTION_FIELDS:
+            code = getattr(r, q)
+            daily[(q, code, day)] += 1
+            rollup[("hour", q, hour, code)] += 1
+            rollup[("week", q, week, code)] += 1
+
+    if not daily:
+        return
+
+    _upsert_counts(SurveyTally, ("question", "option", "day"), daily)
+    _upsert_counts(SurveyRollup, ("grain", "question", "bucket", "option"), rollup)
+
+
+def aggregate_selects(table):
+    """
+    (target table, columns, grouped SELECT over `table`) for every
+    survey_tally / survey_rollup slice: one GROUP BY per question and
+    granularity. `table` is survey_response or an archived copy of it.
+    """
+    for q in QUESTION_FIELDS:
+        col = table.c[q]
+        for grain, bucket in (("hour", _hour_bucket(table)), ("week", _week_bucket(table))):
+            yield (
+                SurveyRollup.__table__,
+                ["grain", "question", "bucket", "option", "count"],
+                db.select(literal(grain), literal(q), bucket, col, func.count(table.c.id))
+                .group_by(bucket, col),
+            )
+        yield (
+            SurveyTally.__table__,
+            ["question", "option", "day", "count"],
+            db.select(literal(q), col, table.c.local_day, func.count(table.c.id))
+            .group_by(table.c.local_day, col),
+        )
+
+
+def rebuild_tallies():
+    """
+    Recomputes survey_tally and survey_rollup from survey_response plus the
+    aggregates stored in each archived month (services/partitions.py).
+    """
+    # داخل الدالة: partitions تستورد aggregate_selects من هنا
+    from services.partitions import archived_aggregates
+
+    # الأشهر المؤرشفة لا تُمسح من جديد: عدّاداتها محسوبة داخل ملف كل شهر.
+    # تُقرأ قبل أول كتابة، فداخل الـ transaction لا يمكن فصل ملف قُرئ منه
+    archived = list(archived_aggregates())
+
+    db.session.query(SurveyTally).delete()
+    db.session.query(SurveyRollup).delete()
+    for target, columns, select in aggregate_selects(SurveyResponse.__table__):
+        db.session.execute(target.insert().from_select(columns, select))
+    for model, keys, counter in archived:
+        _upsert_counts(model, keys, counter)
+    db.session.commit()
+
+
+def question_counts(date_from=None, date_to=None):
+    """
+    {question: {option label: count}} for all questions, optionally limited
+    to a Baghdad-day range. One grouped read over the tally table.
+    """
+    q = db.session.query(
+        SurveyTally.question, SurveyTally.option, func.sum(SurveyTally.count)
+    )
+    if date_from is not None:
+        q = q.filter(SurveyTally.day >= date_from)
+    if date_to is not None:
+        q = q.filter(SurveyTally.day <= date_to)
+
+    counts = {field: {} for field in QUESTION_FIELDS}
+    for question, option, n in q.group_by(SurveyTally.question, SurveyTally.option):
+        if question in counts:
+            counts[question][option] = int(n)
+    return {q: decode_counts(q, c) for q, c in counts.items()}
+
+
+def response_count(date_from=None, date_to=None) -> int:
+    """Responses in a Baghdad-day range, from the tally table (every response answers every question)."""
+    q = db.session.query(func.coalesce(func.sum(SurveyTally.count), 0)).filter(
+        SurveyTally.question == QUESTION_FIELDS[0]
+    )
+    if date_from is not None:
+        q = q.filter(SurveyTally.day >= date_from)
+    if date_to is not None:
+        q = q.filter(SurveyTally.day <= date_to)
+    return int(q.scalar())
+
+
+@click.command("rebuild-tallies")
+@with_appcontext
+def rebuild_tallies_command():
+    """Rebuild survey_tally and survey_rollup from existing survey responses."""
+    rebuild_tallies()
+    click.echo("✅ survey_tally + survey_rollup rebuilt")
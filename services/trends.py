@@ -0,0 +1,124 @@
+"""
+Response trends over an arbitrary Baghdad-day range at hour/day/week
+granularity, read from the rollup tables (survey_rollup for hours and
+weeks, survey_tally for days) so the cost depends on the number of
+buckets, not on the number of responses. Empty buckets are filled with 0.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func
+
+from extensions import db
+from models.response import QUESTION_FIELDS
+from models.rollup import SurveyRollup
+from models.tally import SurveyTally
+from services.options import active_options, option_labels
+from utils import week_start
+
+GRANULARITIES = ("hour", "day", "week")
+
+# أقصى عدد نقاط في الرد (≈ 3 أشهر بالساعة)
+MAX_BUCKETS = 24 * 92
+
+
+def buckets(granularity, day_from, day_to):
+    """Bucket starts covering the Baghdad days [day_from, day_to], oldest first."""
+    if granularity == "hour":
+        start = datetime.combine(day_from, time.min)
+        end = datetime.combine(day_to + timedelta(days=1), time.min)
+        step = timedelta(hours=1)
+    elif granularity == "week":
+        start, end, step = week_start(day_from), day_to + timedelta(days=1), timedelta(weeks=1)
+    else:
+        start, end, step = day_from, day_to + timedelta(days=1), timedelta(days=1)
+
+    out = []
+    while start < end:
+        out.append(start)
+        start += step
+    return out
+
+
+def bucket_count(granularity, day_from, day_to) -> int:
+    days = (day_to - day_from).days + 1
+    if granularity == "hour":
+        return days * 24
+    if granularity == "week":
+        return (day_to - week_start(day_from)).days // 7 + 1
+    return days
+
+
+def _grouped_counts(granularity, question, first, last):
+    """[(bucket, option, count)] for one question within [first, last] bucket starts."""
+    if granularity == "day":
+        return (
+            db.session.query(SurveyTally.day, SurveyTally.option, func.sum(SurveyTally.count))
+            .filter(
+                SurveyTally.question == question,
+                SurveyTally.day >= first,
+                SurveyTally.day <= last,
+            )
+            .group_by(SurveyTally.day, SurveyTally.option)
+            .all()
+        )
+
+    # week buckets are stored as Monday 00:00
+    if granularity == "week":
+        first, last = datetime.combine(first, time.min), datetime.combine(last, time.min)
+    return (
+        db.session.query(SurveyRollup.bucket, SurveyRollup.option, SurveyRollup.count)
+        .filter(
+            SurveyRollup.grain == granularity,
+            SurveyRollup.question == question,
+            SurveyRollup.bucket >= first,
+            SurveyRollup.bucket <= last,
+        )
+        .all()
+    )
+
+
+def _label(bucket, granularity):
+    return bucket.strftime("%Y-%m-%dT%H:00") if granularity == "hour" else bucket.isoformat()
+
+
+def response_trend(granularity, day_from, day_to, by=None):
+    """
+    {"granularity", "labels", "total": [...], "series": {option label: [...]}}
+
+    `by` is an optional question name; its options (active ones plus any
+    legacy option that occurs in the range) become the series.
+    """
+    points = buckets(granularity, day_from, day_to)
+    index = {b: i for i, b in enumerate(points)}
+
+    # كل مشاركة تُحسب مرة واحدة لكل سؤال، فالسؤال الأول يكفي للمجموع
+    question = by or QUESTION_FIELDS[0]
+    rows = _grouped_counts(granularity, question, points[0], points[-1]) if points else []
+
+    total = [0] * len(points)
+    per_option = {}
+    for bucket, option, n in rows:
+        key = bucket.date() if granularity == "week" else bucket
+        i = index.get(key)
+        if i is None:
+            continue
+        total[i] += int(n)
+        if by:
+            per_option.setdefault(option, [0] * len(points))[i] += int(n)
+
+    result = {
+        "granularity": granularity,
+        "from": day_from.isoformat(),
+        "to": day_to.isoformat(),
+        "labels": [_label(b, granularity) for b in points],
+        "total": total,
+    }
+    if by:
+        labels = option_labels()[by]
+        active = set(active_options()[by])
+        result["by"] = by
+        result["series"] = {
+            labels.get(code, str(code)): per_option.get(code, [0] * len(points))
+            for code in sorted(set(per_option) | {c for c, l in labels.items() if l in active})
+        }
+    return result
@@ -0,0 +1,110 @@
+"""
+Per-process cache for Flask-Login's user_loader.
+
+Authenticated requests get a small detached snapshot of the user (id, name,
+email, role — no password hash) instead of a query per request. Entries
+expire after USER_CACHE_TTL seconds; any committed insert/update/delete of a
+User through the ORM bumps a marker file next to the database, and every
+worker drops its cache when the marker changes (one stat() per lookup).
+Bulk UPDATEs that bypass the ORM are only picked up after the TTL.
+"""
+import threading
+import time
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+from models.user import User
+from services.backups import get_sqlite_db_path, on_restore
+
+
+class CachedUser(UserMixin):
+    """What request handlers need from the logged-in user."""
+
+    def __init__(self, user: User):
+        self.id = user.id
+        self.name = user.name
+        self.email = user.email
+        self.role = user.role
+
+
+_cache = {}  # user id -> (expires at, CachedUser or None)
+_cache_generation = None
+_lock = threading.Lock()
+
+
+def _users_marker():
+    db_path = get_sqlite_db_path()
+    return db_path.with_name(db_path.name + ".users")
+
+
+def users_generation() -> int:
+    try:
+        return _users_marker().stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def bump_users_generation() -> None:
+    _users_marker().write_text(str(time.time_ns()))
+
+
+@on_restore
+def clear_user_cache() -> None:
+    with _lock:
+        _cache.clear()
+
+
+def load_user(user_id: str):
+    """user_loader: cached snapshot, reloaded after USER_CACHE_TTL or a user change."""
+    global _cache_generation
+    try:
+        uid = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    generation = users_generation()
+    now = time.monotonic()
+    with _lock:
+        if generation != _cache_generation:
+            _cache.clear()
+            _cache_generation = generation
+        hit = _cache.get(uid)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+
+    user = db.session.get(User, uid)
+    snapshot = CachedUser(user) if user is not None else None
+    with _lock:
+        # لا نخزن نتيجة قديمة إذا تغيّر مستخدم أثناء القراءة
+        if _cache_generation == generation:
+            _cache[uid] = (now + current_app.config["USER_CACHE_TTL"], snapshot)
+    return snapshot
+
+
+# ---------------------------------------------------------------------------
+# Invalidation (after commit, so other workers never reload the old row)
+# ---------------------------------------------------------------------------
+
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["users_changed"] = True
+
+
+for _name in ("after_insert", "after_update", "after_delete"):
+    event.listen(User, _name, _user_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("users_changed", False):
+        bump_users_generation()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("users_changed", None)
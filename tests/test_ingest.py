@@ -0,0 +1,56 @@
+"""
+Group commit (services/ingest.py): one bad row must not fail its batch.
+
+    python -m pytest tests
+"""
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+
+@pytest.fixture(scope="module")
+def app():
+    # create_app يُنفَّذ عند استيراد app، فالقاعدة المؤقتة تُضبط قبله
+    os.environ["DATABASE_DIR"] = tempfile.mkdtemp(prefix="survey-test-")
+    from app import app
+    from services.migrations import init_database
+    init_database(app)
+    return app
+
+
+def _answers(app):
+    from models.option import SURVEY_OPTIONS
+    from services.options import encode_answers
+    with app.app_context():
+        values, errors = encode_answers({q: labels[0] for q, labels in SURVEY_OPTIONS.items()})
+    assert not errors
+    values["created_at"] = datetime.utcnow()  # كما في routes/main.py
+    return values
+
+
+def _count(app):
+    from extensions import db
+    from models.response import SurveyResponse
+    with app.app_context():
+        return db.session.query(db.func.count(SurveyResponse.id)).scalar()
+
+
+def test_bad_row_fails_only_its_own_request(app):
+    from services.ingest import BatchWriter
+
+    values = _answers(app)
+    before = _count(app)
+    # مهلة طويلة وحجم 3: الطلبات الثلاثة تُكتب في دفعة واحدة
+    writer = BatchWriter(app, batch_size=3, flush_interval=5)
+    good = writer.submit(values)
+    bad = writer.submit({**values, "gender": None})  # NOT NULL
+    other = writer.submit(values)
+
+    good.wait(10)
+    other.wait(10)
+    with pytest.raises(IntegrityError):
+        bad.wait(10)
+    assert _count(app) == before + 2
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from functools import wraps
 from flask_login import current_user
 from flask import abort
@@ -13,3 +14,18 @@ def roles_required(*roles):
             return fn(*args, **kwargs)
         return wrapper
     return decorator
+
+# توقيت بغداد (+3 بدون توقيت صيفي)
+BAGHDAD_OFFSET = timedelta(hours=3)
+
+def baghdad_day(dt):
+    """UTC datetime -> Baghdad calendar date."""
+    return (dt + BAGHDAD_OFFSET).date()
+
+def baghdad_hour(dt):
+    """UTC datetime -> start of its Baghdad hour (naive local time)."""
+    return (dt + BAGHDAD_OFFSET).replace(minute=0, second=0, microsecond=0)
+
+def week_start(day):
+    """Monday of the week containing `day`."""
+    return day - timedelta(days=day.weekday())